@@ -0,0 +1,83 @@
+from django.contrib import admin
+from django.http import Http404, HttpResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import RequestProfile, SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('route', 'short_sql', 'calls', 'total_ms', 'max_ms',
+                    'plan_analyzed', 'last_seen')
+    list_filter = ('route', 'vendor', 'plan_analyzed')
+    search_fields = ('sql', 'route', 'fingerprint')
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+
+    @admin.display(description='SQL')
+    def short_sql(self, obj):
+        return obj.sql[:120]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status',
+                    'duration_ms', 'user')
+    list_filter = ('route', 'method')
+    list_select_related = ('user',)
+    search_fields = ('path', 'route')
+    fields = ('user', 'method', 'path', 'route', 'status', 'duration_ms',
+              'created_at', 'download', 'summary_text', 'memory_text')
+    readonly_fields = fields
+
+    @admin.display(description='Данные cProfile')
+    def download(self, obj):
+        if obj.stats is None:
+            return 'Не сохранены: превышен REQUEST_PROFILE_MAX_SIZE'
+        url = reverse('admin:api_requestprofile_download', args=(obj.pk,))
+        return format_html('<a href="{}">Скачать .prof</a>', url)
+
+    @admin.display(description='Сводка cProfile')
+    def summary_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.summary)
+
+    @admin.display(description='Сводка tracemalloc')
+    def memory_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.memory_summary or '—')
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/',
+                 self.admin_site.admin_view(self.download_view),
+                 name='api_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = RequestProfile.objects.filter(pk=pk).first()
+        if (not self.has_view_permission(request, profile)
+                or profile is None or profile.stats is None):
+            raise Http404
+        response = HttpResponse(
+            bytes(profile.stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = (
+            f'attachment; filename="request-{profile.pk}.prof"')
+        return response
+
+    # Профили содержат пути кода и данные запросов: только суперпользователи.
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
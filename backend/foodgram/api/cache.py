@@ -0,0 +1,154 @@
+import hashlib
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from api.metrics import API_CACHE_REQUESTS
+from api.models import DataVersion
+
+API_CACHE_ALIAS = 'api'
+GENERATION_KEY = 'api:generation'
+INGREDIENTS_VERSION_KEY = 'api:ingredients:version'
+TAGS_VERSION_KEY = 'api:tags:version'
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+# Счётчики попаданий/промахов/обходов кэша в рамках процесса.
+cache_stats = Counter(hit=0, miss=0, bypass=0)
+
+# Прочитанные версии данных: {ключ: (версия, время чтения)}.
+_generations = {}
+
+# Обработчики on_commit для bump_generation_on_commit: {ключ: функция}.
+_bump_callbacks = {}
+
+
+def get_cache():
+    return caches[API_CACHE_ALIAS]
+
+
+def get_generation(key=GENERATION_KEY):
+    """Текущая версия данных key.
+
+    Версии хранятся в базе (DataVersion), чтобы их видели все воркеры
+    и команды управления; в процессе значение запоминается на
+    DATA_VERSION_TTL секунд.
+    """
+    remembered = _generations.get(key)
+    now = time.monotonic()
+    if remembered is not None and now - remembered[1] < (
+            settings.DATA_VERSION_TTL):
+        return remembered[0]
+    generation = DataVersion.objects.filter(key=key).values_list(
+        'version', flat=True).first()
+    if generation is None:
+        # Начинаем с метки времени, а не с 1: после пересоздания базы
+        # страницы из файлового кэша не станут снова доступны.
+        generation = DataVersion.objects.get_or_create(
+            key=key, defaults={'version': int(time.time() * 1000)}
+        )[0].version
+    _generations[key] = (generation, now)
+    return generation
+
+
+def bump_generation(key=GENERATION_KEY):
+    """Делает недоступными все данные, закэшированные под ключом key."""
+    if not DataVersion.objects.filter(key=key).update(
+            version=F('version') + 1):
+        get_generation(key)
+        DataVersion.objects.filter(key=key).update(version=F('version') + 1)
+    _generations.pop(key, None)
+
+
+def bump_generation_on_commit(key=GENERATION_KEY):
+    """Увеличивает версию key один раз после коммита текущей транзакции.
+
+    Повторный вызов в той же транзакции находит свой обработчик в
+    очереди on_commit соединения и ничего не добавляет. Откат транзакции
+    или точки сохранения убирает обработчик из очереди, и следующий
+    вызов поставит его снова.
+    """
+    callback = _bump_callbacks.get(key)
+    if callback is None:
+        callback = _bump_callbacks.setdefault(
+            key, lambda: bump_generation(key))
+    connection = transaction.get_connection()
+    if any(entry[1] is callback for entry in connection.run_on_commit):
+        return
+    transaction.on_commit(callback)
+
+
+def build_cache_key(request, prefix):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    raw = f'{request.get_host()}{request.path}?{urlencode(params)}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'api:{get_generation()}:{prefix}:{digest}'
+
+
+class AnonymousCacheMixin:
+    """Кэширует list/retrieve для анонимных GET-запросов.
+
+    Ключ строится из нормализованной строки запроса и текущего поколения
+    кэша; поколение увеличивается сигналами из api.signals при любом
+    изменении рецептов и тегов. Миксин ставится перед ConditionalGetMixin:
+    ETag и Last-Modified сохраняются вместе с ответом, и попадание в кэш,
+    в том числе с ответом 304, обходится без запросов к базе.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.method != 'GET' or not request.user.is_anonymous:
+            cache_stats['bypass'] += 1
+            API_CACHE_REQUESTS.labels(self.basename, 'bypass').inc()
+            response = handler(request, *args, **kwargs)
+            response['X-Cache'] = 'BYPASS'
+            return response
+
+        cache = get_cache()
+        key = build_cache_key(request, self.basename)
+        cached = cache.get(key)
+        if cached is not None:
+            cache_stats['hit'] += 1
+            API_CACHE_REQUESTS.labels(self.basename, 'hit').inc()
+            data, status_code, headers = cached
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    headers.get('Last-Modified', '')))
+            if response is None:
+                response = Response(data, status=status_code)
+                for header, value in headers.items():
+                    response[header] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        cache_stats['miss'] += 1
+        API_CACHE_REQUESTS.labels(self.basename, 'miss').inc()
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            # Валидаторы хранятся вместе с ответом: при попадании 304
+            # отдаётся без запросов к базе.
+            headers = {
+                header: response[header] for header in CACHED_HEADERS
+                if response.has_header(header)
+            }
+            cache.set(key, (response.data, response.status_code, headers))
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,126 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from api.cache import get_generation
+from recipes.models import Favorite, Recipe, Shopping_cart
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class ConditionalGetMixin:
+    """Добавляет ETag к list/retrieve и отвечает 304 до сериализации.
+
+    Наследник реализует get_etag_source(), возвращающую дешёвый отпечаток
+    данных ответа, и при необходимости get_last_modified().
+    """
+
+    def get_etag_source(self):
+        raise NotImplementedError
+
+    def get_last_modified(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_etag(self, request):
+        source = self.get_etag_source()
+        if source is None:
+            return None
+        raw = (f'{source}:{request.user.pk}:{request.get_full_path()}:'
+               f'{request.accepted_renderer.format}')
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        last_modified = self.get_last_modified()
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class TableVersionConditionalMixin(ConditionalGetMixin):
+    """ETag по версии справочной таблицы из api.cache."""
+    table_version_key = None
+
+    def get_etag_source(self):
+        return get_generation(self.table_version_key)
+
+
+class RecipeConditionalMixin(ConditionalGetMixin):
+    """ETag по поколению кэша API и состоянию пользователя.
+
+    Поколение увеличивается при любом изменении рецептов, их тегов и
+    ингредиентов, тегов и профилей авторов (api.signals), поэтому для
+    списка его достаточно и выборку не нужно агрегировать. Для рецепта
+    добавляется его дата изменения. Избранное, корзина и подписки
+    пользователя меняются только вставкой и удалением строк, поэтому их
+    описывают число строк и максимальный id.
+    """
+
+    def get_user_state(self):
+        """Число строк и последний id избранного, корзины и подписок.
+
+        Все шесть значений читаются одним запросом из подзапросов по
+        индексу user_id.
+        """
+        user = self.request.user
+        if user.is_anonymous:
+            return ''
+        annotations = {}
+        for model in (Favorite, Shopping_cart, Subscription):
+            rows = model.objects.filter(
+                user=OuterRef('pk')).order_by().values('user')
+            name = model._meta.model_name
+            annotations[f'{name}_total'] = Subquery(
+                rows.annotate(value=Count('id')).values('value'))
+            annotations[f'{name}_last'] = Subquery(
+                rows.annotate(value=Max('id')).values('value'))
+        state = User.objects.filter(pk=user.pk).values(**annotations).get()
+        return ':'.join(str(value) for value in state.values())
+
+    def get_etag_source(self):
+        source = f'{get_generation()}:{self.get_user_state()}'
+        if self.action != 'retrieve':
+            return source
+        updated_at = self.get_updated_at()
+        if updated_at is None:
+            return None
+        return f'{source}:{updated_at.isoformat()}'
+
+    def get_updated_at(self):
+        if not hasattr(self, '_updated_at'):
+            pk = str(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+            self._updated_at = None
+            if pk.isdigit():
+                self._updated_at = Recipe.objects.filter(
+                    pk=pk).values_list('updated_at', flat=True).first()
+        return self._updated_at
+
+    def get_last_modified(self):
+        # Для списков дата изменения не отражает удалённые рецепты,
+        # а для пользователя — его избранное, поэтому Last-Modified
+        # отдаётся только анонимам на страницу рецепта.
+        if self.action != 'retrieve' or not self.request.user.is_anonymous:
+            return None
+        updated_at = self.get_updated_at()
+        return int(updated_at.timestamp()) if updated_at else None
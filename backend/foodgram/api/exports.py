@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+from api.utils import render_pdf
+from api.workers import get_executor
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FILENAME = 'shoping-list.pdf'
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+
+# Время последней очистки старых выгрузок в этом процессе.
+_last_sweep = None
+
+
+def get_export_id(rows):
+    """Хэш содержимого списка: одинаковые списки дают один и тот же файл."""
+    payload = json.dumps(
+        [(row['name'], row['unit'], row['total']) for row in rows],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_export_path(user_id, export_id, suffix='.pdf'):
+    """Файл выгрузки в папке пользователя: чужие выгрузки не видны."""
+    return (Path(settings.SHOPPING_LIST_EXPORT_ROOT) / str(user_id)
+            / f'{export_id}{suffix}')
+
+
+def get_export_status(user_id, export_id):
+    """Статус выгрузки по файлам на диске, общим для всех воркеров."""
+    if get_export_path(user_id, export_id).exists():
+        return DONE
+    if get_export_path(user_id, export_id, '.error').exists():
+        return FAILED
+    pending = get_export_path(user_id, export_id, '.pending')
+    try:
+        started = pending.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    # Отметка осталась от упавшего процесса — выгрузку можно запустить снова.
+    if time.time() - started > settings.SHOPPING_LIST_EXPORT_TIMEOUT:
+        return None
+    return PENDING
+
+
+def delete_old_exports(max_age):
+    """Удаляет файлы выгрузок старше max_age секунд, возвращает их число."""
+    root = Path(settings.SHOPPING_LIST_EXPORT_ROOT)
+    expired = time.time() - max_age
+    deleted = 0
+    for path in root.glob('*/*'):
+        try:
+            if path.stat().st_mtime < expired:
+                path.unlink()
+                deleted += 1
+        except FileNotFoundError:
+            # Файл удалил другой воркер.
+            continue
+    return deleted
+
+
+def sweep_exports():
+    """Не чаще раза в SHOPPING_LIST_EXPORT_SWEEP_INTERVAL удаляет старые."""
+    global _last_sweep
+    now = time.monotonic()
+    if (_last_sweep is not None and now - _last_sweep
+            < settings.SHOPPING_LIST_EXPORT_SWEEP_INTERVAL):
+        return
+    _last_sweep = now
+    delete_old_exports(settings.SHOPPING_LIST_EXPORT_MAX_AGE)
+
+
+def render_export(user_id, export_id, rows):
+    folder = get_export_path(user_id, export_id).parent
+    folder.mkdir(parents=True, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            render_pdf(rows, file)
+        # Файл появляется под итоговым именем только целиком.
+        os.replace(temp_path, get_export_path(user_id, export_id))
+    except Exception:
+        logger.exception('Не удалось сформировать список покупок %s',
+                         export_id)
+        get_export_path(user_id, export_id, '.error').touch()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    finally:
+        get_export_path(user_id, export_id, '.pending').unlink(
+            missing_ok=True)
+    # Новые файлы появляются только здесь, здесь же удаляются старые.
+    sweep_exports()
+
+
+def start_export(user_id, rows, sync=False):
+    """Запускает выгрузку, если готового файла с таким содержимым нет.
+
+    Небольшие списки (или любые при sync=True) рисуются сразу в запросе,
+    большие — в пуле потоков. Пока выгрузка идёт, повторный запуск
+    возвращает PENDING, упавшая выгрузка запускается заново. Файлы лежат
+    в папке пользователя, одинаковые списки одного пользователя дают
+    один файл. Возвращает id выгрузки и её статус.
+    """
+    export_id = get_export_id(rows)
+    status = get_export_status(user_id, export_id)
+    if status in (DONE, PENDING):
+        return export_id, status
+
+    get_export_path(user_id, export_id, '.error').unlink(missing_ok=True)
+    pending = get_export_path(user_id, export_id, '.pending')
+    pending.parent.mkdir(parents=True, exist_ok=True)
+    pending.touch()
+    if sync or len(rows) <= settings.SHOPPING_LIST_SYNC_MAX_ROWS:
+        render_export(user_id, export_id, rows)
+        return export_id, get_export_status(user_id, export_id)
+
+    get_executor('shopping-list-export').submit(
+        render_export, user_id, export_id, rows)
+    return export_id, PENDING
+
+
+def export_response(user_id, export_id):
+    """Отдаёт готовый файл: через nginx (X-Accel-Redirect) или сам.
+
+    Возвращает None, если файл уже удалён, например очисткой старых
+    выгрузок.
+    """
+    path = get_export_path(user_id, export_id)
+    accel_url = settings.SHOPPING_LIST_EXPORT_ACCEL_URL
+    if accel_url:
+        if not path.exists():
+            return None
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Accel-Redirect'] = f'{accel_url}{user_id}/{path.name}'
+        response['Content-Disposition'] = (
+            f'attachment; filename="{EXPORT_FILENAME}"')
+        return response
+    try:
+        file = path.open('rb')
+    except FileNotFoundError:
+        return None
+    return FileResponse(
+        file,
+        as_attachment=True,
+        filename=EXPORT_FILENAME,
+        content_type='application/pdf',
+    )
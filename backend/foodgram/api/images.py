@@ -0,0 +1,122 @@
+import logging
+import threading
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from api.cache import bump_generation
+from api.workers import get_executor
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+RENDITION_FORMAT = 'WEBP'
+RENDITION_QUALITY = 80
+# Наибольшая сторона копии в пикселях.
+RENDITION_SIZES = {
+    'thumbnail': 160,
+    'card': 640,
+    'full': 1600,
+}
+
+_save_lock = threading.Lock()
+
+
+def get_rendition_name(image_name, rendition):
+    stem = PurePosixPath(image_name).stem
+    return f'{RENDITIONS_DIR}/{stem}_{rendition}.webp'
+
+
+def make_rendition(image, size):
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    copy.save(buffer, RENDITION_FORMAT, quality=RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def save_renditions(image_name, overwrite=False):
+    # Имя оригинала — хэш содержимого, поэтому готовые копии с тем же
+    # именем подходят любому рецепту с этой картинкой.
+    names = {
+        rendition: get_rendition_name(image_name, rendition)
+        for rendition in RENDITION_SIZES
+    }
+    missing = [
+        rendition for rendition, name in names.items()
+        if overwrite or not default_storage.exists(name)
+    ]
+    if not missing:
+        return names
+    with default_storage.open(image_name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for rendition in missing:
+            content = ContentFile(
+                make_rendition(image, RENDITION_SIZES[rendition]))
+            # Одну картинку могут обрабатывать два потока сразу, и без
+            # блокировки второй сохранил бы копию под другим именем.
+            with _save_lock:
+                if overwrite:
+                    default_storage.delete(names[rendition])
+                if not default_storage.exists(names[rendition]):
+                    default_storage.save(names[rendition], content)
+    return names
+
+
+def build_renditions(recipe_id, image_name, overwrite=False):
+    """Сохраняет уменьшенные копии изображения и отмечает их в рецепте."""
+    try:
+        renditions = save_renditions(image_name, overwrite)
+        renditions['source'] = image_name
+        # Если картинку успели заменить, копии старой не записываются.
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=image_name
+        ).update(image_renditions=renditions, updated_at=timezone.now())
+        if updated:
+            bump_generation()
+    except Exception:
+        logger.exception('Не удалось подготовить копии изображения %s',
+                         image_name)
+
+
+def build_renditions_in_worker(recipe_id, image_name):
+    try:
+        build_renditions(recipe_id, image_name)
+    finally:
+        # Поток пула не проходит через обработку запроса Django,
+        # поэтому соединение с базой закрывается вручную.
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """Ставит в очередь копии изображения, если они ещё не готовы."""
+    image_name = recipe.image.name
+    if not image_name:
+        return
+    if recipe.image_renditions.get('source') == image_name:
+        return
+    get_executor('recipe-images').submit(
+        build_renditions_in_worker, recipe.pk, image_name)
+
+
+def get_rendition_urls(recipe):
+    """Ссылки на копии; пока их нет, все ведут на оригинал."""
+    if not recipe.image:
+        return None
+    renditions = recipe.image_renditions
+    if renditions.get('source') != recipe.image.name:
+        renditions = {}
+    original = recipe.image.url
+    return {
+        rendition: (default_storage.url(renditions[rendition])
+                    if rendition in renditions else original)
+        for rendition in RENDITION_SIZES
+    }
@@ -0,0 +1,59 @@
+import threading
+from bisect import bisect_left
+
+from api.cache import INGREDIENTS_VERSION_KEY, get_generation
+from recipes.models import Ingredient
+
+# Символ больше любого другого: prefix + MAX_CHAR ограничивает диапазон.
+MAX_CHAR = '\U0010ffff'
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов для автодополнения по началу названия.
+
+    Хранит отсортированный список названий в casefold и ищет диапазон
+    совпадений двоичным поиском. Загружается при первом обращении и
+    перестраивается, когда меняется версия таблицы ингредиентов
+    (её увеличивают сигналы api.signals и команды импорта).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # Ключи и строки заменяются одним присваиванием, чтобы читатели
+        # в других потоках не увидели их из разных версий.
+        self._data = ([], [])
+
+    def _load(self):
+        rows = sorted(
+            ((name.casefold(), pk, name, unit)
+             for pk, name, unit in Ingredient.objects.values_list(
+                 'id', 'name', 'measurement_unit').order_by().iterator()),
+        )
+        return (
+            [row[0] for row in rows],
+            [{'id': pk, 'name': name, 'measurement_unit': unit}
+             for _, pk, name, unit in rows],
+        )
+
+    def _ensure_fresh(self):
+        version = get_generation(INGREDIENTS_VERSION_KEY)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._data = self._load()
+                self._version = version
+
+    def search(self, prefix, limit=None):
+        self._ensure_fresh()
+        keys, rows = self._data
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + MAX_CHAR, start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return rows[start:end]
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,359 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import time
+import tracemalloc
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.cache import get_cache
+from api.exports import get_export_path
+from recipes.models import Favorite, Ingredient, Recipe, Shopping_cart, Tag
+
+User = get_user_model()
+
+SEED_OPTIONS = {
+    'users': 200,
+    'recipes': 1000,
+    'tags': 6,
+    'ingredients': 500,
+    'ingredients_per_recipe': 8,
+    'favorites_per_user': 20,
+    'carts_per_user': 6,
+    'subscriptions_per_user': 8,
+    'seed': 20231127,
+    'prefix': 'bench',
+}
+
+# Бюджеты SQL-запросов по задуманному плану каждого эндпоинта, а не по
+# замеру. Общие части:
+#   token — проверка токена (TokenAuthentication), 1;
+#   state — избранное, корзина и подписки пользователя для ETag, 1;
+#   page — COUNT(*), страница, prefetch тегов и ингредиентов, 4;
+#   detail — рецепт, prefetch тегов и ингредиентов, 3;
+#   subscribed — id авторов, на которых подписан пользователь, 1;
+#   begin — BEGIN транзакции, который SQLite отправляет отдельным запросом.
+# Версия данных (api.cache) в settings_sqlite запоминается на час и в
+# бюджеты не входит. Числа не зависят от размера страницы и числа тегов и
+# ингредиентов: рост означает N+1.
+QUERY_BUDGETS = {
+    # page.
+    'recipes_list_anon': 4,
+    # token + state + page + subscribed.
+    'recipes_list_auth': 7,
+    # То же и теги из фильтра одним запросом.
+    'recipes_list_tags': 8,
+    'recipes_list_favorited': 7,
+    'recipes_list_in_cart': 7,
+    # updated_at для ETag + detail.
+    'recipe_detail_anon': 4,
+    # token + state + updated_at + detail + subscribed.
+    'recipe_detail_auth': 7,
+    # token, теги и ингредиенты одним запросом каждые, begin, INSERT
+    # рецепта, счётчик рецептов автора, теги (существующие связи и
+    # INSERT), INSERT ингредиентов, версия данных, detail + subscribed.
+    'recipe_create': 14,
+    # token, рецепт, теги, ингредиенты, begin, текущие теги, текущие
+    # ингредиенты, удаление строк (SELECT для сигналов и DELETE),
+    # bulk_update, корзины с рецептом, UPDATE рецепта, версия данных,
+    # detail + subscribed.
+    'recipe_update': 17,
+    # token, begin, INSERT ... ON CONFLICT, favorites_count, рецепт.
+    'favorite_add': 5,
+    # token, begin, DELETE ... RETURNING, favorites_count.
+    'favorite_remove': 4,
+    # token, begin, INSERT ... ON CONFLICT, ингредиенты рецепта, строки
+    # списка покупок (INSERT, UPDATE, DELETE нулевых), рецепт.
+    'shopping_cart_add': 8,
+    # token, begin, DELETE ... RETURNING, ингредиенты рецепта, UPDATE и
+    # DELETE нулевых строк списка покупок.
+    'shopping_cart_remove': 6,
+    # token, COUNT(*), авторы страницы, рецепты авторов (ROW_NUMBER),
+    # subscribed.
+    'subscriptions': 5,
+    # Поиск идёт по индексу в памяти процесса.
+    'ingredients_search': 0,
+    # token + строки списка покупок.
+    'shopping_list_txt': 2,
+    'shopping_list_pdf': 2,
+}
+
+
+class Scenario:
+    """Один запрос бенчмарка с подготовкой и уборкой вокруг замера."""
+
+    def __init__(self, name, method, url, status, data=None, auth=True,
+                 setup=None, cleanup=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.status = status
+        self.data = data
+        self.auth = auth
+        self.setup = setup
+        self.cleanup = cleanup
+
+    def run(self, client, capture=False):
+        """Выполняет запрос; возвращает ответ, время, размер и запросы."""
+        if self.setup:
+            self.setup()
+        # Кэш анонимных ответов сбрасывается: меряется сама работа.
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as context:
+            if not capture:
+                # Без записи запросов замер времени точнее.
+                connection.force_debug_cursor = False
+            started = time.perf_counter()
+            response = getattr(client, self.method)(
+                self.url, self.data, format='json')
+            if response.streaming:
+                size = sum(
+                    len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+            # request_started очищает журнал запросов, поэтому запросы
+            # забираются до уборки.
+            queries = list(context.captured_queries) if capture else []
+        if self.cleanup:
+            self.cleanup(response)
+        return response, elapsed, size, queries
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк основных эндпоинтов API на SQLite: время, число '
+            'SQL-запросов и пиковая память. Завершается ошибкой, если '
+            'эндпоинт превысил бюджет запросов. Запускается с '
+            'DJANGO_SETTINGS_MODULE=foodgram.settings_sqlite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз замерять время каждого запроса.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов в JSON.',
+        )
+        parser.add_argument(
+            '--only', nargs='+', choices=sorted(QUERY_BUDGETS),
+            help='Запустить только указанные сценарии.',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.prepare_database()
+        user = self.get_user()
+        anon = APIClient()
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        results = []
+        for scenario in self.get_scenarios(user):
+            if options['only'] and scenario.name not in options['only']:
+                continue
+            result = self.measure(
+                scenario, client if scenario.auth else anon,
+                options['repeat'])
+            results.append(result)
+            self.stdout.write(
+                f'{result["name"]:<24} {result["status"]:>3} '
+                f'{result["queries"]:>3}/{result["budget"]:<3} запросов '
+                f'{result["time_ms"]["median"]:8.2f} мс '
+                f'{result["peak_memory_kb"]:8.0f} КБ'
+                f'{"" if result["ok"] else "  ПРЕВЫШЕН БЮДЖЕТ"}'
+            )
+
+        report = {
+            'commit': self.get_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seed': SEED_OPTIONS,
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+        failed = [result['name'] for result in results if not result['ok']]
+        if failed:
+            raise CommandError(
+                f'Превышен бюджет запросов или неверный статус: '
+                f'{", ".join(failed)}')
+
+    def prepare_database(self):
+        """Пересоздаёт базу SQLite и наполняет её данными SEED_OPTIONS."""
+        database = settings.DATABASES['default']
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError(
+                'Бенчмарк пересоздаёт базу и запускается только на SQLite: '
+                'DJANGO_SETTINGS_MODULE=foodgram.settings_sqlite.')
+        connection.close()
+        os.makedirs(os.path.dirname(database['NAME']), exist_ok=True)
+        if os.path.exists(database['NAME']):
+            os.remove(database['NAME'])
+        call_command('migrate', verbosity=0)
+        call_command('generate_load_data', stdout=StringIO(), **SEED_OPTIONS)
+
+    def get_user(self):
+        """Активный пользователь: с избранным, корзиной и подписками."""
+        return User.objects.filter(
+            username__startswith=f'{SEED_OPTIONS["prefix"]}_'
+        ).annotate(
+            favorites_total=Count('favorites', distinct=True),
+            carts_total=Count('shops', distinct=True),
+            subscriptions_total=Count('subscribes', distinct=True),
+        ).filter(
+            favorites_total__gt=0, carts_total__gt=0, subscriptions_total__gt=0
+        ).order_by('-carts_total', 'id').first()
+
+    def get_scenarios(self, user):
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        other = Recipe.objects.exclude(
+            in_favorite__user=user).exclude(
+            in_shopping_cart__user=user).order_by('id').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        ingredients = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True)[:10])
+        recipe_data = {
+            'name': 'Бенчмарк',
+            'text': 'Рецепт для замера.',
+            'cooking_time': 10,
+            'image': None,
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredients': [
+                {'id': pk, 'amount': number + 1}
+                for number, pk in enumerate(ingredients)
+            ],
+        }
+        update_data = dict(recipe_data, ingredients=[
+            {'id': pk, 'amount': number + 2}
+            for number, pk in enumerate(ingredients[2:])
+        ])
+        # Вспомогательный клиент готовит данные вне замера.
+        helper = APIClient()
+        helper.force_authenticate(user)
+        own = helper.post('/api/recipes/', recipe_data, format='json').data
+
+        def delete_created(response):
+            Recipe.objects.filter(pk=response.data['id']).delete()
+
+        def restore_own(response):
+            helper.patch(f'/api/recipes/{own["id"]}/', recipe_data,
+                         format='json')
+
+        def delete_exports():
+            # Готовый PDF отдаётся по хэшу содержимого: без удаления
+            # замерялась бы отдача файла, а не рисование.
+            shutil.rmtree(get_export_path(user.pk, '').parent,
+                          ignore_errors=True)
+
+        favorite_url = f'/api/recipes/{other.pk}/favorite/'
+        cart_url = f'/api/recipes/{other.pk}/shopping_cart/'
+        tag_query = '&'.join(f'tags={slug}' for slug in tags)
+        return [
+            Scenario('recipes_list_anon', 'get', '/api/recipes/?limit=20',
+                     200, auth=False),
+            Scenario('recipes_list_auth', 'get', '/api/recipes/?limit=20',
+                     200),
+            Scenario('recipes_list_tags', 'get',
+                     f'/api/recipes/?limit=20&{tag_query}', 200),
+            Scenario('recipes_list_favorited', 'get',
+                     '/api/recipes/?limit=20&is_favorited=1', 200),
+            Scenario('recipes_list_in_cart', 'get',
+                     '/api/recipes/?limit=20&is_in_shopping_cart=1', 200),
+            Scenario('recipe_detail_anon', 'get',
+                     f'/api/recipes/{recipe.pk}/', 200, auth=False),
+            Scenario('recipe_detail_auth', 'get',
+                     f'/api/recipes/{recipe.pk}/', 200),
+            Scenario('recipe_create', 'post', '/api/recipes/', 201,
+                     data=recipe_data, cleanup=delete_created),
+            Scenario('recipe_update', 'patch',
+                     f'/api/recipes/{own["id"]}/', 200, data=update_data,
+                     cleanup=restore_own),
+            Scenario('favorite_add', 'post', favorite_url, 201,
+                     cleanup=lambda response: Favorite.objects.remove(
+                         user.pk, other.pk)),
+            Scenario('favorite_remove', 'delete', favorite_url, 204,
+                     setup=lambda: Favorite.objects.add(user.pk, other.pk)),
+            Scenario('shopping_cart_add', 'post', cart_url, 201,
+                     cleanup=lambda response: Shopping_cart.objects.remove(
+                         user.pk, other.pk)),
+            Scenario('shopping_cart_remove', 'delete', cart_url, 204,
+                     setup=lambda: Shopping_cart.objects.add(
+                         user.pk, other.pk)),
+            Scenario('subscriptions', 'get',
+                     '/api/users/subscriptions/?limit=20&recipes_limit=3',
+                     200),
+            Scenario('ingredients_search', 'get',
+                     f'/api/ingredients/?name={SEED_OPTIONS["prefix"]}',
+                     200, auth=False),
+            Scenario('shopping_list_txt', 'get',
+                     '/api/recipes/download_shopping_cart/?file_format=txt',
+                     200),
+            Scenario('shopping_list_pdf', 'get',
+                     '/api/recipes/download_shopping_cart/', 200,
+                     setup=delete_exports),
+        ]
+
+    def measure(self, scenario, client, repeat):
+        # Первый вызов прогревает процесс, как первый запрос воркера.
+        scenario.run(client)
+        response, _, size, queries = scenario.run(client, capture=True)
+        timings = [scenario.run(client)[1] for _ in range(repeat)]
+        # Память меряется отдельно: tracemalloc сильно замедляет код.
+        tracemalloc.start()
+        scenario.run(client)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        if self.verbosity > 1:
+            for query in queries:
+                self.stdout.write(f'    {query["sql"][:200]}')
+        queries = len(queries)
+        budget = QUERY_BUDGETS[scenario.name]
+        ok = queries <= budget and response.status_code == scenario.status
+        return {
+            'name': scenario.name,
+            'method': scenario.method.upper(),
+            'url': scenario.url,
+            'status': response.status_code,
+            'expected_status': scenario.status,
+            'queries': queries,
+            'budget': budget,
+            'ok': ok,
+            'time_ms': {
+                'min': min(timings) * 1000,
+                'median': statistics.median(timings) * 1000,
+                'max': max(timings) * 1000,
+            },
+            'peak_memory_kb': peak / 1024,
+            'response_bytes': size,
+        }
+
+    @staticmethod
+    def get_commit():
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', 'HEAD'), capture_output=True,
+                text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
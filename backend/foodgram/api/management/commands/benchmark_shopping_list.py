@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.utils import STREAM_FORMATS, render_pdf
+
+
+def make_ingredients(size):
+    return [
+        {'name': f'Ингредиент номер {number}', 'unit': 'г',
+         'total': number * 10}
+        for number in range(1, size + 1)
+    ]
+
+
+def render(ingredients, file_format='pdf'):
+    if file_format in STREAM_FORMATS:
+        generator = STREAM_FORMATS[file_format][0]
+        return sum(len(chunk.encode()) for chunk in generator(ingredients))
+    with tempfile.TemporaryFile() as file:
+        render_pdf(ingredients, file)
+        return file.tell()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время и пиковую память генерации списка покупок '
+            'для корзин разного размера. С --baseline сравнивает замер с '
+            'сохранённым ранее.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Количество строк ингредиентов в корзине.',
+        )
+        parser.add_argument(
+            '--formats', nargs='+', default=['pdf', *STREAM_FORMATS],
+            choices=['pdf', *STREAM_FORMATS],
+            help='Форматы списка покупок для сравнения.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторить замер для каждого размера.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help=('JSON-файл базового замера. Если файла нет, в него '
+                  'записываются результаты, иначе результаты сравниваются '
+                  'с ним.'),
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline'] and os.path.exists(options['baseline']):
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        results = {}
+        for file_format in options['formats']:
+            # Первый вызов прогревает процесс, как первый запрос воркера.
+            render(make_ingredients(1), file_format)
+            for size in options['sizes']:
+                key = f'{file_format}:{size}'
+                results[key] = self.measure(
+                    file_format, size, options['repeat'])
+                if baseline and key in baseline:
+                    self.compare(baseline[key], results[key])
+        if options['baseline'] and baseline is None:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(
+                f'Базовый замер записан в {options["baseline"]}.')
+
+    def compare(self, before, after):
+        def change(name):
+            if not before[name]:
+                return 0
+            return (after[name] - before[name]) / before[name] * 100
+
+        self.stdout.write(
+            f'{"":>4} {"было":>6}: '
+            f'{before["time_ms"]:8.2f} мс ({change("time_ms"):+.0f}%), '
+            f'пик памяти {before["peak_memory_kb"]:8.0f} КБ '
+            f'({change("peak_memory_kb"):+.0f}%)'
+        )
+
+    def measure(self, file_format, size, repeat):
+        ingredients = make_ingredients(size)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            length = render(ingredients, file_format)
+            timings.append(time.perf_counter() - started)
+        # Память меряется отдельно: tracemalloc сильно замедляет код.
+        tracemalloc.start()
+        render(ingredients, file_format)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{file_format:>4} {size:>6} строк: '
+            f'{min(timings) * 1000:8.2f} мс, '
+            f'пик памяти {peak / 1024:8.0f} КБ, {length} байт'
+        )
+        return {
+            'time_ms': min(timings) * 1000,
+            'peak_memory_kb': peak / 1024,
+            'bytes': length,
+        }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.images import build_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Готовит уменьшенные копии изображений рецептов, '
+            'у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересобрать копии для всех рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions')
+        built = 0
+        for recipe in recipes.iterator():
+            source = recipe.image_renditions.get('source')
+            if options['force'] or source != recipe.image.name:
+                build_renditions(
+                    recipe.pk, recipe.image.name, options['force'])
+                built += 1
+        self.stdout.write(f'Обработано рецептов: {built}')
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.exports import delete_old_exports
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые выгрузки списков покупок в PDF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int,
+            default=settings.SHOPPING_LIST_EXPORT_MAX_AGE,
+            help='Удалять файлы старше стольких секунд.',
+        )
+
+    def handle(self, *args, **options):
+        deleted = delete_old_exports(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов выгрузок: {deleted}.'))
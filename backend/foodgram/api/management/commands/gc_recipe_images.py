@@ -0,0 +1,98 @@
+import re
+import time
+from pathlib import PurePosixPath
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_generation
+from api.images import RENDITION_SIZES, RENDITIONS_DIR, get_rendition_name
+from recipes.models import Recipe
+
+HASH_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы изображений рецептов и их копии, '
+            'на которые не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help=('Не трогать файлы моложе стольких секунд: их могла '
+                  'записать ещё не завершённая транзакция.'),
+        )
+        parser.add_argument(
+            '--rehash', action='store_true',
+            help=('Сначала переложить изображения со старыми именами '
+                  'под хэш содержимого.'),
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        if options['rehash'] and not options['dry_run']:
+            self.rehash(storage)
+
+        references = Recipe.objects.image_references()
+        keep = set(references)
+        for image_name, renditions in Recipe.objects.exclude(
+                image='').values_list('image', 'image_renditions').iterator():
+            keep.update(
+                get_rendition_name(image_name, rendition)
+                for rendition in RENDITION_SIZES
+            )
+            keep.update(
+                name for key, name in renditions.items() if key != 'source')
+
+        deadline = time.time() - options['min_age']
+        removed = freed = 0
+        for directory, files_storage in (
+                (PurePosixPath(Recipe._meta.get_field('image').upload_to),
+                 storage),
+                (PurePosixPath(RENDITIONS_DIR), default_storage)):
+            if not files_storage.exists(str(directory)):
+                continue
+            for filename in files_storage.listdir(str(directory))[1]:
+                name = str(directory / filename)
+                if name in keep:
+                    continue
+                if files_storage.get_modified_time(
+                        name).timestamp() > deadline:
+                    continue
+                removed += 1
+                freed += files_storage.size(name)
+                if not options['dry_run']:
+                    files_storage.delete(name)
+
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(
+            f'Файлов в использовании: {len(references)}, '
+            f'из них общих для нескольких рецептов: {shared}. '
+            f'{"Будет удалено" if options["dry_run"] else "Удалено"}: '
+            f'{removed} ({freed / 1024 ** 2:.1f} МБ).'
+        )
+
+    def rehash(self, storage):
+        recipes = Recipe.objects.exclude(image='').only('id', 'image')
+        renamed = 0
+        for recipe in recipes.iterator():
+            name = recipe.image.name
+            if HASH_NAME.match(PurePosixPath(name).stem):
+                continue
+            if not storage.exists(name):
+                continue
+            with storage.open(name) as file:
+                new_name = storage.save(name, file)
+            # Копии под новым именем соберёт build_image_renditions.
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image=new_name, image_renditions={})
+            renamed += 1
+        if renamed:
+            # update() не вызывает сигналы, а закэшированные ответы API
+            # ссылаются на старые имена файлов.
+            bump_generation()
+        self.stdout.write(f'Переименовано изображений: {renamed}')
@@ -0,0 +1,113 @@
+"""Метрики в формате Prometheus.
+
+Если задана переменная окружения PROMETHEUS_MULTIPROC_DIR, значения
+пишутся в файлы этой папки, и /api/metrics/ складывает метрики всех
+воркеров gunicorn. Папка очищается при старте gunicorn
+(gunicorn.conf.py); для manage.py и других процессов она создаётся при
+импорте модуля, если её ещё нет.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+UNMATCHED_ROUTE = 'unmatched'
+
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    # Без папки первая запись метрики падает с FileNotFoundError.
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUEST_DURATION = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса.',
+    ('route', 'method'),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер тела ответа.',
+    ('route', 'method'),
+    buckets=tuple(256 * 4 ** power for power in range(9)),
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_http_request_db_queries',
+    'Число SQL-запросов за один запрос.',
+    ('route', 'method'),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+RESPONSES = Counter(
+    'foodgram_http_responses_total',
+    'Ответы по кодам статуса.',
+    ('route', 'method', 'status'),
+)
+API_CACHE_REQUESTS = Counter(
+    'foodgram_api_cache_requests_total',
+    'Обращения к кэшу ответов API: hit, miss, bypass.',
+    ('cache', 'result'),
+)
+PDF_RENDER_DURATION = Histogram(
+    'foodgram_pdf_render_duration_seconds',
+    'Время рисования PDF со списком покупок.',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+def get_route(request):
+    """Имя маршрута из роутера DRF, например recipe-list.
+
+    Метка не зависит от id и строки запроса, поэтому число рядов
+    ограничено числом маршрутов.
+    """
+    match = request.resolver_match
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.view_name or UNMATCHED_ROUTE
+
+
+def get_response_size(response):
+    if response.streaming:
+        size = response.get('Content-Length')
+        return int(size) if size else None
+    return len(response.content)
+
+
+def observe_request(request, response, duration, queries=None):
+    route = get_route(request)
+    method = request.method if request.method in METHODS else 'other'
+    REQUEST_DURATION.labels(route, method).observe(duration)
+    RESPONSES.labels(route, method, str(response.status_code)).inc()
+    size = get_response_size(response)
+    if size is not None:
+        RESPONSE_SIZE.labels(route, method).observe(size)
+    if queries is not None:
+        REQUEST_QUERIES.labels(route, method).observe(queries)
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def has_access(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(header, f'Bearer {token}'):
+            return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics(request):
+    """Метрики для Prometheus: по токену METRICS_TOKEN или для staff."""
+    if not has_access(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
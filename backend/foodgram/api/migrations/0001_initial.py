@@ -0,0 +1,41 @@
+# Generated by Django 3.2.16 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, verbose_name='Отпечаток')),
+                ('route', models.CharField(max_length=200, verbose_name='View')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('vendor', models.CharField(max_length=20, verbose_name='СУБД')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Медленных вызовов')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Суммарное время, мс')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Наибольшее время, мс')),
+                ('plan', models.TextField(blank=True, verbose_name='План последнего EXPLAIN')),
+                ('plan_analyzed', models.BooleanField(default=False, verbose_name='EXPLAIN ANALYZE')),
+                ('plan_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата плана')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-total_ms',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slowquery',
+            constraint=models.UniqueConstraint(fields=('fingerprint', 'route'), name='unique_slow_query'),
+        ),
+    ]
@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.db import models
+
+
+class DataVersion(models.Model):
+    """Версия данных для кэша API, общая для всех процессов."""
+    key = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Ключ',
+    )
+    version = models.BigIntegerField(
+        verbose_name='Версия',
+    )
+
+    class Meta:
+        verbose_name = 'версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
+
+
+class SlowQuery(models.Model):
+    """Медленный SQL-запрос, сгруппированный по отпечатку и view."""
+    fingerprint = models.CharField(
+        max_length=32,
+        verbose_name='Отпечаток',
+    )
+    route = models.CharField(
+        max_length=200,
+        verbose_name='View',
+    )
+    sql = models.TextField(
+        verbose_name='Нормализованный SQL',
+    )
+    vendor = models.CharField(
+        max_length=20,
+        verbose_name='СУБД',
+    )
+    calls = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Медленных вызовов',
+    )
+    total_ms = models.FloatField(
+        default=0,
+        verbose_name='Суммарное время, мс',
+    )
+    max_ms = models.FloatField(
+        default=0,
+        verbose_name='Наибольшее время, мс',
+    )
+    plan = models.TextField(
+        blank=True,
+        verbose_name='План последнего EXPLAIN',
+    )
+    plan_analyzed = models.BooleanField(
+        default=False,
+        verbose_name='EXPLAIN ANALYZE',
+    )
+    plan_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата плана',
+    )
+    first_seen = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Впервые',
+    )
+    last_seen = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Последний раз',
+    )
+
+    class Meta:
+        verbose_name = 'медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ('-total_ms',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('fingerprint', 'route'),
+                name='unique_slow_query'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.route}: {self.sql[:80]}'
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса, снятый по флагу суперпользователя."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        verbose_name='Пользователь',
+    )
+    method = models.CharField(
+        max_length=10,
+        verbose_name='Метод',
+    )
+    path = models.CharField(
+        max_length=2000,
+        verbose_name='Адрес',
+    )
+    route = models.CharField(
+        max_length=200,
+        verbose_name='View',
+    )
+    status = models.PositiveSmallIntegerField(
+        verbose_name='Статус ответа',
+    )
+    duration_ms = models.FloatField(
+        verbose_name='Время, мс',
+    )
+    stats = models.BinaryField(
+        null=True,
+        verbose_name='Данные cProfile (.prof)',
+    )
+    summary = models.TextField(
+        verbose_name='Сводка cProfile',
+    )
+    memory_summary = models.TextField(
+        blank=True,
+        verbose_name='Сводка tracemalloc',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата',
+    )
+
+    class Meta:
+        verbose_name = 'профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
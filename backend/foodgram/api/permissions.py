@@ -12,4 +12,4 @@ class IsAuthorOrAdminPermission(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in permissions.SAFE_METHODS
                 or request.user.is_superuser
-                or obj.author == request.user)
+                or obj.author_id == request.user.id)
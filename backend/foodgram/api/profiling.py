@@ -0,0 +1,147 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.metrics import get_route
+from api.models import RequestProfile
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+MEMORY = 'memory'
+
+# cProfile и tracemalloc общие для процесса, поэтому одновременно
+# профилируется один запрос.
+_profile_lock = threading.Lock()
+
+
+def get_profile_mode(request):
+    """None, если профиль не запрошен, иначе 'cpu' или 'memory'."""
+    mode = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    if not mode or mode == '0':
+        return None
+    return MEMORY if mode == MEMORY else 'cpu'
+
+
+def get_superuser(request):
+    """Суперпользователь из сессии админки или из токена API."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_superuser:
+        return user
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if authenticated and authenticated[0].is_superuser:
+        return authenticated[0]
+    return None
+
+
+def get_summary(profiler):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(
+        settings.REQUEST_PROFILE_SUMMARY_LINES)
+    stats.sort_stats('tottime').print_stats(
+        settings.REQUEST_PROFILE_SUMMARY_LINES)
+    return stream.getvalue(), stats
+
+
+def get_memory_summary(snapshot, peak):
+    snapshot = snapshot.filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),))
+    lines = [f'Пик: {peak / 1024:.0f} КБ', '']
+    lines.extend(
+        str(stat) for stat in snapshot.statistics('lineno')[
+            :settings.REQUEST_PROFILE_SUMMARY_LINES])
+    return '\n'.join(lines)
+
+
+def delete_old_profiles():
+    """Оставляет REQUEST_PROFILE_KEEP свежих профилей не старше срока."""
+    expired = timezone.now() - timedelta(
+        days=settings.REQUEST_PROFILE_MAX_AGE_DAYS)
+    RequestProfile.objects.filter(created_at__lt=expired).delete()
+    keep = RequestProfile.objects.order_by('-created_at').values_list(
+        'created_at', flat=True)[settings.REQUEST_PROFILE_KEEP:][:1]
+    if keep:
+        RequestProfile.objects.filter(created_at__lte=keep[0]).delete()
+
+
+class RequestProfileMiddleware:
+    """Профилирует запрос суперпользователя под cProfile.
+
+    Профиль включается заголовком X-Profile или параметром _profile в
+    строке запроса; значение memory дополнительно включает tracemalloc.
+    Результат сохраняется в RequestProfile, а ссылка на него в админке
+    возвращается в заголовке X-Profile. Тело потоковых ответов
+    формируется после middleware и в профиль не попадает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = get_profile_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        user = get_superuser(request)
+        if user is None:
+            return self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile'] = 'busy'
+            return response
+        try:
+            return self.profile(request, user, mode == MEMORY)
+        finally:
+            _profile_lock.release()
+
+    def profile(self, request, user, trace_memory):
+        # tracemalloc мог запустить кто-то другой, например бенчмарк.
+        trace_memory = trace_memory and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+        summary, stats = get_summary(profiler)
+        data = marshal.dumps(stats.stats)
+        profile = RequestProfile.objects.create(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            route=get_route(request),
+            status=response.status_code,
+            duration_ms=duration * 1000,
+            # Слишком большой профиль не сохраняется, остаётся сводка.
+            stats=(data if len(data) <= settings.REQUEST_PROFILE_MAX_SIZE
+                   else None),
+            summary=summary,
+            memory_summary=(
+                get_memory_summary(snapshot, peak) if trace_memory else ''),
+        )
+        delete_old_profiles()
+        response['X-Profile'] = reverse(
+            'admin:api_requestprofile_change', args=(profile.pk,))
+        return response
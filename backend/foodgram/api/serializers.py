@@ -1,25 +1,61 @@
 import base64
 
 import webcolors
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from PIL import Image
 from rest_framework import exceptions, serializers
 
+from api.fields import BulkPrimaryKeyRelatedField, ImageRenditionsField
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredients,
-                            Shopping_cart, Tag)
+                            Shopping_cart, ShoppingListIngredient, Tag)
 from users.serializers import CustomUserSerializer
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} МБ.',
+        'too_many_pixels': ('Изображение не должно быть больше '
+                            '{max_pixels} пикселей.'),
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
+            # Размер проверяется по длине строки, до декодирования.
+            self.check_size(len(imgstr) * 3 // 4)
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        elif hasattr(data, 'size'):
+            self.check_size(data.size)
+        if hasattr(data, 'seek'):
+            self.check_pixels(data)
 
         return super().to_internal_value(data)
 
+    def check_size(self, size):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large',
+                      max_size=settings.RECIPE_IMAGE_MAX_SIZE // 1024 ** 2)
+
+    def check_pixels(self, file):
+        # Image.open читает только заголовок, пиксели не распаковываются.
+        try:
+            width, height = Image.open(file).size
+        except Image.DecompressionBombError:
+            width, height = settings.RECIPE_IMAGE_MAX_PIXELS + 1, 1
+        except Exception:
+            # Битый файл отклонит проверка в ImageField.
+            return
+        finally:
+            file.seek(0)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels',
+                      max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS)
+
 
 class Hex2NameColor(serializers.Field):
     def to_representation(self, value):
@@ -88,32 +124,29 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField(required=False, allow_null=True)
+    images = ImageRenditionsField()
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=user, recipe=obj).exists()
+        # Флаг приходит аннотацией из Recipe.objects.with_user_flags
+        return getattr(obj, 'is_favorited', False)
 
     def get_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Shopping_cart.objects.filter(user=user, recipe=obj).exists()
+        return getattr(obj, 'is_in_shopping_cart', False)
 
     def get_ingredients(self, obj):
-        ingredients = RecipeIngredients.objects.filter(recipe=obj)
+        ingredients = obj.recipeingredients_set.all()
         serializer = RecipeIngredientsSerializer(ingredients, many=True)
 
         return serializer.data
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date',)
+        exclude = ('pub_date', 'updated_at', 'favorites_count',
+                   'image_renditions')
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
         required=True
@@ -136,36 +169,57 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         )
     )
 
-    def create_or_update_ingredients(self, instance, ingredients):
-        recipe_ingredients = []
-
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            ingredient_id = ingredient['id']
-            ingredient_obj = Ingredient.objects.filter(
-                pk=ingredient_id).first()
-            if not ingredient_obj:
-                raise serializers.ValidationError(
-                    f'Ингредиент с id {ingredient_id} не найден.')
-            recipe_ingredients.append(
-                RecipeIngredients(
+    def create_or_update_ingredients(self, instance, ingredients,
+                                     created=False):
+        """Приводит ингредиенты рецепта к ingredients.
+
+        Вставляются, обновляются и удаляются только изменившиеся строки.
+        Возвращает количества ингредиентов до и после изменения.
+        """
+        new_amounts = {item['id']: item['amount'] for item in ingredients}
+        existing = {} if created else {
+            item.ingredient_id: item
+            for item in RecipeIngredients.objects.filter(recipe=instance)
+        }
+        old_amounts = {pk: item.amount for pk, item in existing.items()}
+
+        to_delete = [
+            item.pk for pk, item in existing.items() if pk not in new_amounts
+        ]
+        to_update = []
+        to_create = []
+        for ingredient_id, amount in new_amounts.items():
+            item = existing.get(ingredient_id)
+            if item is None:
+                to_create.append(RecipeIngredients(
                     recipe=instance,
-                    ingredient=ingredient_obj,
+                    ingredient_id=ingredient_id,
                     amount=amount
-                )
-            )
-        RecipeIngredients.objects.filter(recipe=instance).delete()
-        RecipeIngredients.objects.bulk_create(recipe_ingredients)
+                ))
+            elif item.amount != amount:
+                item.amount = amount
+                to_update.append(item)
+
+        if to_delete:
+            RecipeIngredients.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredients.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            RecipeIngredients.objects.bulk_create(to_create)
+        return old_amounts, new_amounts
 
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
 
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        recipe.tags.set(tags)
-
-        self.create_or_update_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(author=author, **validated_data)
+            # У нового рецепта тегов нет: set() лишь прочитал бы пустой
+            # список.
+            recipe.tags.add(*tags)
+            self.create_or_update_ingredients(
+                recipe, ingredients, created=True)
 
         return recipe
 
@@ -174,17 +228,19 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         if tags is None:
             raise exceptions.ValidationError(
                 'Необходимо предоставить теги для обновления рецепта.')
-        if tags is not None:
-            instance.tags.set(tags)
 
         ingredients = validated_data.pop('ingredients', None)
         if ingredients is None:
             raise exceptions.ValidationError(
                 'Необходимо предоставить ингредиенты для обновления рецепта.')
 
-        self.create_or_update_ingredients(instance, ingredients)
-
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            instance.tags.set(tags)
+            old_amounts, new_amounts = self.create_or_update_ingredients(
+                instance, ingredients)
+            ShoppingListIngredient.objects.change_recipe(
+                instance, old_amounts, new_amounts)
+            return super().update(instance, validated_data)
 
     def validate_tags(self, value):
         if not value:
@@ -203,132 +259,118 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             raise exceptions.ValidationError(
                 'Нужно добавить хотя бы один ингредиент.'
             )
-        if 'ingredients' in self.initial_data:
-            ingredients = [item['id'] for item in value]
-            for ingredient in ingredients:
-                if ingredients.count(ingredient) > 1:
-                    raise exceptions.ValidationError(
-                        'У рецепта не может быть два одинаковых ингредиента.')
+        ingredient_ids = [item['id'] for item in value]
+        unique_ids = set(ingredient_ids)
+        if len(unique_ids) != len(ingredient_ids):
+            raise exceptions.ValidationError(
+                'У рецепта не может быть два одинаковых ингредиента.')
+
+        missing = unique_ids - Ingredient.objects.in_bulk(unique_ids).keys()
+        if missing:
+            raise exceptions.ValidationError(
+                'Ингредиенты с id '
+                f'{", ".join(map(str, sorted(missing)))} не найдены.')
         return value
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user).get(pk=instance.pk)
         serializer = RecipeSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         )
         return serializer.data
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date',)
+        exclude = ('pub_date', 'updated_at', 'favorites_count',
+                   'image_renditions')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', "image", "cooking_time")
-
-
-class FavoriteCreateSerializer(serializers.Serializer):
-    recipe_id = serializers.IntegerField()
-
-    def validate_recipe_id(self, value):
-        user = self.context['request'].user
+        fields = ('id', 'name', "image", 'images', "cooking_time")
 
-        recipe = Recipe.objects.filter(pk=value).first()
-        if not recipe:
-            raise serializers.ValidationError(f'Рецепт с id {value} не найден')
 
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError('Рецепт уже в избранном.')
+class UserRecipeCreateSerializer(serializers.Serializer):
+    """Добавляет рецепт в избранное или корзину одним INSERT.
 
-        return value
+    Наследник задаёт model с менеджером UserRecipeQuerySet и текст
+    ошибки для уже добавленного рецепта.
+    """
+    recipe_id = serializers.IntegerField()
+    model = None
+    already_added_message = None
 
     def create(self, validated_data):
         user = self.context['request'].user
         recipe_id = validated_data['recipe_id']
-        recipe = Recipe.objects.filter(pk=recipe_id).first()
-        if not recipe:
-            raise serializers.ValidationError(
-                f'Рецепт с id {recipe_id} не найден')
-        favorite = Favorite.objects.create(user=user, recipe=recipe)
-        self.recipe_instance = recipe
-        return favorite
+        if not self.model.objects.add(user.id, recipe_id):
+            # Вставка не прошла: рецепт уже добавлен или его нет.
+            if Recipe.objects.filter(pk=recipe_id).exists():
+                message = self.already_added_message
+            else:
+                message = f'Рецепт с id {recipe_id} не найден'
+            raise serializers.ValidationError({'recipe_id': [message]})
+        return Recipe.objects.get(pk=recipe_id)
 
     def to_representation(self, instance):
         serializer = FavoriteSerializer(
-            self.recipe_instance,
+            instance,
             context={'request': self.context.get('request')}
         )
         return serializer.data
 
 
-class FavoriteDeleteSerializer(serializers.Serializer):
+class UserRecipeDeleteSerializer(serializers.Serializer):
+    """Удаляет рецепт из избранного или корзины одним DELETE."""
     recipe_id = serializers.IntegerField()
+    model = None
+    not_added_message = None
 
-    def validate_recipe_id(self, value):
-        recipe = get_object_or_404(Recipe, pk=value)
+    def delete(self, instance):
         user = self.context['request'].user
-        if not Favorite.objects.filter(user=user, recipe=recipe).exists():
+        recipe_id = instance['recipe_id']
+        if not self.model.objects.remove(user.id, recipe_id):
+            get_object_or_404(Recipe, pk=recipe_id)
             raise serializers.ValidationError(
-                'Рецепта нет в избранном, либо он уже удален.')
-        return value
+                {'recipe_id': [self.not_added_message]})
 
-    def delete(self, instance):
-        user = self.context['request'].user
-        recipe = get_object_or_404(Recipe, pk=instance['recipe_id'])
-        favorite = Favorite.objects.get(user=user, recipe=recipe)
-        favorite.delete()
 
+class FavoriteCreateSerializer(UserRecipeCreateSerializer):
+    model = Favorite
+    already_added_message = 'Рецепт уже в избранном.'
 
-class ShoppingCartCreateSerializer(serializers.Serializer):
-    recipe_id = serializers.IntegerField()
 
-    def validate_recipe_id(self, value):
-        recipe = Recipe.objects.filter(pk=value).first()
-        if not recipe:
-            raise serializers.ValidationError(f'Рецепт с id {value} не найден')
-        user = self.context['request'].user
-        if Shopping_cart.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError('Рецепт уже в списке покупок.')
-        self.recipe_instance = recipe
-        return value
+class FavoriteDeleteSerializer(UserRecipeDeleteSerializer):
+    model = Favorite
+    not_added_message = 'Рецепта нет в избранном, либо он уже удален.'
 
-    def create(self, validated_data):
-        user = self.context['request'].user
-        recipe_id = validated_data['recipe_id']
-        recipe = Recipe.objects.filter(pk=recipe_id).first()
-        if not recipe:
-            raise serializers.ValidationError(
-                f'Рецепт с id {recipe_id} не найден')
-        shopping_cart = Shopping_cart.objects.create(user=user, recipe=recipe)
-        return shopping_cart
 
-    def to_representation(self, instance):
-        serializer = FavoriteSerializer(
-            self.recipe_instance,
-            context={'request': self.context.get('request')}
-        )
-        return serializer.data
+class ShoppingCartCreateSerializer(UserRecipeCreateSerializer):
+    model = Shopping_cart
+    already_added_message = 'Рецепт уже в списке покупок.'
 
 
-class ShoppingCartDeleteSerializer(serializers.Serializer):
-    recipe_id = serializers.IntegerField()
+class ShoppingCartDeleteSerializer(UserRecipeDeleteSerializer):
+    model = Shopping_cart
+    not_added_message = 'Рецепта нет в списке покупок, либо он уже удален.'
 
-    def validate_recipe_id(self, value):
 
-        recipe = get_object_or_404(Recipe, pk=value)
-        user = self.context['request'].user
-        if not Shopping_cart.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                'Рецепта нет в списке покупок, либо он уже удален.')
-        return value
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления и удаления."""
+    MAX_RECIPES = 100
 
-    def delete(self, instance):
-        user = self.context['request'].user
-        recipe = get_object_or_404(Recipe, pk=instance['recipe_id'])
-        shopping_cart = get_object_or_404(
-            Shopping_cart, user=user,
-            recipe=recipe)
-        shopping_cart.delete()
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_RECIPES,
+    )
+
+    def validate_recipes(self, value):
+        # Повторы не ошибка: клиент получит один результат на рецепт.
+        return list(dict.fromkeys(value))
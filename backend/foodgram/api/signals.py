@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import (INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY,
+                       bump_generation_on_commit)
+from api.images import schedule_renditions
+from recipes.models import Ingredient, Recipe, RecipeIngredients, Tag
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_api_cache(sender, **kwargs):
+    # Увеличиваем поколение после коммита, чтобы параллельный запрос
+    # не закэшировал данные, которые ещё не видны в базе. Сохранение
+    # рецепта с тегами и ингредиентами увеличивает его один раз.
+    bump_generation_on_commit()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_data(sender, update_fields=None, **kwargs):
+    # Имя и фамилия автора встроены в ответы с рецептами. Вход в админку
+    # меняет только last_login и кэш не трогает.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_generation_on_commit()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    bump_generation_on_commit(INGREDIENTS_VERSION_KEY)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_version(sender, **kwargs):
+    bump_generation_on_commit(TAGS_VERSION_KEY)
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_renditions(sender, instance, **kwargs):
+    # Копии готовятся в пуле потоков, когда файл и рецепт уже сохранены.
+    transaction.on_commit(lambda: schedule_renditions(instance))
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import random
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from api.models import SlowQuery
+from api.workers import get_executor
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+# Списки IN разной длины дают один отпечаток.
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL без значений: строки, числа и списки параметров заменены."""
+    sql = STRINGS.sub('?', sql)
+    sql = NUMBERS.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = PLACEHOLDER_LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def get_fingerprint(normalized_sql):
+    return hashlib.md5(normalized_sql.encode()).hexdigest()
+
+
+def can_analyze(sql):
+    """EXPLAIN ANALYZE выполняет запрос, поэтому только для чтения."""
+    statement = sql.lstrip().upper()
+    return (connection.vendor == 'postgresql'
+            and settings.SLOW_QUERY_EXPLAIN_ANALYZE
+            and statement.startswith('SELECT')
+            and ' FOR UPDATE' not in statement)
+
+
+def explain(sql, params):
+    """План запроса в виде текста и признак EXPLAIN ANALYZE."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            rows = cursor.fetchall()
+        depth = {0: 0}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, 0) + 1
+            lines.append(f'{"  " * (depth[node] - 1)}{detail}')
+        return '\n'.join(lines), False
+
+    analyze = can_analyze(sql)
+    options = '(ANALYZE, BUFFERS)' if analyze else ''
+    # Откат страхует от побочных эффектов функций внутри SELECT.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {options} {sql}', params)
+            rows = cursor.fetchall()
+        transaction.set_rollback(True)
+    return '\n'.join(row[0] for row in rows), analyze
+
+
+def record_slow_query(route, sql, params, duration, explainable):
+    normalized = normalize_sql(sql)
+    fingerprint = get_fingerprint(normalized)
+    duration_ms = duration * 1000
+    changes = {
+        'calls': F('calls') + 1,
+        'total_ms': F('total_ms') + duration_ms,
+        'max_ms': Greatest('max_ms', Value(duration_ms)),
+        'last_seen': timezone.now(),
+    }
+    statement = sql.lstrip().upper()
+    if (explainable and statement.startswith(EXPLAINABLE)
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE):
+        try:
+            plan, analyzed = explain(sql, params)
+        except Exception:
+            logger.exception('Не удалось получить план запроса %s',
+                             fingerprint)
+        else:
+            changes.update(plan=plan, plan_analyzed=analyzed,
+                           plan_updated_at=timezone.now())
+
+    queries = SlowQuery.objects.filter(fingerprint=fingerprint, route=route)
+    if queries.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SlowQuery.objects.create(
+                fingerprint=fingerprint, route=route, sql=normalized,
+                vendor=connection.vendor, calls=1, total_ms=duration_ms,
+                max_ms=duration_ms, plan=changes.get('plan', ''),
+                plan_analyzed=changes.get('plan_analyzed', False),
+                plan_updated_at=changes.get('plan_updated_at'),
+            )
+    except IntegrityError:
+        # Строку только что создал другой воркер.
+        queries.update(**changes)
+
+
+def record_slow_queries(route, slow_queries):
+    try:
+        for slow_query in slow_queries:
+            record_slow_query(route, *slow_query)
+    except Exception:
+        logger.exception('Не удалось сохранить медленные запросы %s', route)
+    finally:
+        # Поток пула не проходит через обработку запроса Django,
+        # поэтому соединение с базой закрывается вручную.
+        connection.close()
+
+
+def schedule_slow_queries(route, slow_queries):
+    """Сохраняет медленные запросы и их планы в фоне, после ответа."""
+    get_executor('slow-queries').submit(
+        record_slow_queries, route, slow_queries)
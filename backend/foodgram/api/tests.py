@@ -0,0 +1,498 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.cache import get_cache, get_generation
+from api.exports import (DONE, FAILED, PENDING, export_response, get_export_id,
+                         get_export_path, get_export_status)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredients,
+                            Shopping_cart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+# Запросы на страницу списка рецептов по плану, без учёта размера страницы:
+# COUNT(*), страница, теги и ингредиенты (prefetch). Пользователю нужны ещё
+# его состояние для ETag и id авторов, на которых он подписан.
+# force_authenticate не проверяет токен.
+RECIPE_LIST_QUERIES = {
+    'anonymous': 4,
+    'authenticated': 6,
+}
+
+
+@override_settings(DATA_VERSION_TTL=3600)
+class RecipeListQueriesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag-{number}',
+                color=f'#00000{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        ]
+        for number in range(25):
+            # У каждого рецепта свой автор, чтобы N+1 по авторам и
+            # подпискам был виден.
+            author = User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='pass')
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}', text='Текст', cooking_time=10,
+                author=author)
+            recipe.tags.set(tags[:number % 3 + 1])
+            RecipeIngredients.objects.bulk_create(
+                RecipeIngredients(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1)
+                for ingredient in ingredients[:number % 5 + 1]
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                Subscription.objects.create(user=cls.user, author=author)
+            if number % 3:
+                Shopping_cart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.force_authenticate(self.user)
+
+    def assert_page_queries(self, client, expected, limit):
+        url = f'/api/recipes/?limit={limit}'
+        # Первый запрос читает версии данных, которые процесс запоминает.
+        client.get(url)
+        get_cache().clear()
+        with self.assertNumQueries(expected):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous_list_queries(self):
+        for limit in (6, 20):
+            with self.subTest(limit=limit):
+                self.assert_page_queries(
+                    self.anonymous, RECIPE_LIST_QUERIES['anonymous'], limit)
+
+    def test_authenticated_list_queries(self):
+        for limit in (6, 20):
+            with self.subTest(limit=limit):
+                self.assert_page_queries(
+                    self.authenticated,
+                    RECIPE_LIST_QUERIES['authenticated'], limit)
+
+    def test_count_without_user_flags(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.authenticated.get('/api/recipes/?limit=6')
+        self.assertEqual(response.status_code, 200)
+        counts = [query['sql'] for query in context.captured_queries
+                  if 'COUNT(*)' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertNotIn('EXISTS', counts[0])
+
+    def test_server_timing_spans(self):
+        response = self.authenticated.get('/api/recipes/?limit=6')
+        spans = {part.split(';')[0]
+                 for part in response['Server-Timing'].split(', ')}
+        self.assertEqual(
+            spans, {'db', 'serializer', 'view', 'render', 'total'})
+
+
+@override_settings(DATA_VERSION_TTL=0)
+class RecipeConditionalGetTest(TransactionTestCase):
+    # Версия данных увеличивается после настоящего коммита.
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', text='Текст', cooking_time=10, author=author)
+
+    def test_cached_not_modified_without_queries(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        with self.assertNumQueries(1):
+            # Остаётся только чтение версии данных: DATA_VERSION_TTL=0.
+            response = self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_authenticated_not_modified(self):
+        user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.client.force_authenticate(user)
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/'):
+            with self.subTest(url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                # Избранное пользователя входит в ETag.
+                self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.data)
+                self.client.delete(
+                    f'/api/recipes/{self.recipe.pk}/favorite/')
+
+    def test_anonymous_detail_last_modified(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_recipe_change_invalidates_etag(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        for number in range(8):
+            Recipe.objects.create(
+                name=f'Рецепт {number}', text='Текст', cooking_time=10,
+                author=cls.author)
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='pass')
+
+    def walk(self, url, expected_queries):
+        ids = []
+        while url:
+            with self.assertNumQueries(expected_queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_recipes(self):
+        # Страница и prefetch тегов и ингредиентов, без COUNT(*).
+        ids = self.walk('/api/recipes/?cursor=&limit=3', 3)
+        self.assertEqual(ids, list(Recipe.objects.order_by(
+            '-pub_date', 'id').values_list('id', flat=True)))
+
+    def test_users(self):
+        ids = self.walk('/api/users/?cursor=&limit=3', 1)
+        self.assertEqual(
+            ids, list(User.objects.order_by('id').values_list(
+                'id', flat=True)))
+
+    def test_page_number_by_default(self):
+        response = self.client.get('/api/recipes/?limit=3')
+        self.assertEqual(response.data['count'], 8)
+
+
+class ShoppingListDownloadTest(TestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+        recipe = Recipe.objects.create(
+            name='Рецепт', text='Текст', cooking_time=10, author=cls.user)
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        RecipeIngredients.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=200)
+        Shopping_cart.objects.add(cls.user.pk, recipe.pk)
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = self.settings(SHOPPING_LIST_EXPORT_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.export_id = get_export_id([
+            {'name': 'Мука', 'unit': 'г', 'total': 200}])
+
+    def get_status(self):
+        return get_export_status(self.user.pk, self.export_id)
+
+    def test_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(self.get_status(), DONE)
+
+    def test_pending_export_is_not_rendered_again(self):
+        pending = get_export_path(self.user.pk, self.export_id, '.pending')
+        pending.parent.mkdir(parents=True)
+        pending.touch()
+        with mock.patch('api.exports.render_pdf') as render_pdf:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], PENDING)
+        render_pdf.assert_not_called()
+
+    def test_failed_export(self):
+        with mock.patch('api.exports.render_pdf', side_effect=ValueError):
+            with self.assertLogs('api.exports', 'ERROR'):
+                response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.get_status(), FAILED)
+        # Следующая загрузка запускает упавшую выгрузку заново.
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_status(), DONE)
+
+    def test_removed_file_is_rendered_again(self):
+        self.client.get(self.url)
+        get_export_path(self.user.pk, self.export_id).unlink()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_status(), DONE)
+
+    def test_file_removed_after_status_check(self):
+        self.client.get(self.url)
+        rendered = export_response(self.user.pk, self.export_id)
+        # Первая попытка отдать файл не находит его на диске.
+        with mock.patch('api.views.export_response',
+                        side_effect=[None, rendered]) as patched:
+            response = self.client.get(self.url)
+        self.assertIs(response, rendered)
+        self.assertEqual(patched.call_count, 2)
+
+    def test_export_file_removed(self):
+        self.client.get(self.url)
+        get_export_path(self.user.pk, self.export_id).unlink()
+        response = self.client.get(
+            f'/api/recipes/shopping_cart_export/{self.export_id}/file/')
+        self.assertEqual(response.status_code, 404)
+
+
+class GenerationBumpTest(TransactionTestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.tag = Tag.objects.create(
+            name='Завтрак', slug='breakfast', color='#E26C2D')
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        ]
+        get_generation()
+
+    def save_recipe(self):
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                name='Рецепт', text='Текст', cooking_time=10,
+                author=self.author)
+            recipe.tags.set([self.tag])
+            for ingredient in self.ingredients:
+                RecipeIngredients.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10)
+
+    def count_bumps(self, context):
+        return sum(
+            query['sql'].startswith('UPDATE "api_dataversion"')
+            for query in context.captured_queries
+        )
+
+    def test_one_bump_per_transaction(self):
+        with CaptureQueriesContext(connection) as context:
+            self.save_recipe()
+        self.assertEqual(self.count_bumps(context), 1)
+
+    def test_bump_after_savepoint_rollback(self):
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        self.save_recipe()
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.save_recipe()
+        self.assertEqual(self.count_bumps(context), 1)
+
+
+class UserRecipeToggleTest(TestCase):
+    """Избранное и корзина: INSERT ... ON CONFLICT и DELETE ... RETURNING."""
+    models = {'favorite': Favorite, 'shopping_cart': Shopping_cart}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.recipe, cls.other = (
+            Recipe.objects.create(
+                name=name, text='Текст', cooking_time=10, author=cls.user)
+            for name in ('Рецепт', 'Другой рецепт')
+        )
+        cls.missing_id = cls.other.pk + 100
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_and_remove(self):
+        for name, model in self.models.items():
+            url = f'/api/recipes/{self.recipe.pk}/{name}/'
+            with self.subTest(name):
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['id'], self.recipe.pk)
+                # Повторное добавление не создаёт вторую строку.
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    model.objects.filter(
+                        user=self.user, recipe=self.recipe).count(), 1)
+
+                response = self.client.delete(url)
+                self.assertEqual(response.status_code, 204)
+                response = self.client.delete(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(model.objects.exists())
+
+    def test_favorites_count(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.client.post(url)
+        self.client.post(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.client.delete(url)
+        self.client.delete(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_missing_recipe(self):
+        for name in self.models:
+            url = f'/api/recipes/{self.missing_id}/{name}/'
+            with self.subTest(name):
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipe_id', response.data)
+                response = self.client.delete(url)
+                self.assertEqual(response.status_code, 404)
+
+    def test_batch_with_duplicates(self):
+        for name, model in self.models.items():
+            url = f'/api/recipes/{name}/'
+            with self.subTest(name):
+                model.objects.add(self.user.pk, self.other.pk)
+                response = self.client.post(url, {'recipes': [
+                    self.recipe.pk, self.recipe.pk, self.other.pk,
+                    self.missing_id,
+                ]}, format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['results'], [
+                    {'id': self.recipe.pk, 'status': 'added'},
+                    {'id': self.other.pk, 'status': 'already_added'},
+                    {'id': self.missing_id, 'status': 'not_found'},
+                ])
+                self.assertEqual(model.objects.count(), 2)
+
+                response = self.client.delete(url, {'recipes': [
+                    self.recipe.pk, self.recipe.pk, self.missing_id,
+                ]}, format='json')
+                self.assertEqual(response.data['results'], [
+                    {'id': self.recipe.pk, 'status': 'removed'},
+                    {'id': self.missing_id, 'status': 'not_found'},
+                ])
+                self.assertEqual(
+                    list(model.objects.values_list('recipe', flat=True)),
+                    [self.other.pk])
+
+
+class RecipeTagsValidationTest(TestCase):
+    """Теги рецепта проверяются одним запросом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.tags = [
+            Tag.objects.create(name=name, slug=slug, color=color)
+            for name, slug, color in (('Обед', 'lunch', '#49B64E'),
+                                      ('Ужин', 'dinner', '#8775D2'))
+        ]
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, tags):
+        return self.client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+            'image': None,
+            'tags': tags,
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 100}],
+        }, format='json')
+
+    def test_tags_saved(self):
+        response = self.post([tag.pk for tag in self.tags])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            {tag['id'] for tag in response.data['tags']},
+            {tag.pk for tag in self.tags})
+
+    def test_invalid_tags(self):
+        missing_id = self.tags[-1].pk + 100
+        for tags in ([], 'lunch', [missing_id], ['lunch'], [True]):
+            with self.subTest(tags=tags):
+                response = self.post(tags)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('tags', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkShoppingListBaselineTest(TestCase):
+
+    def run_benchmark(self, baseline):
+        stdout = StringIO()
+        call_command('benchmark_shopping_list', sizes=[10], formats=['txt'],
+                     repeat=1, baseline=baseline, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_records_then_compares(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        baseline = os.path.join(directory, 'baseline.json')
+
+        self.assertIn('Базовый замер записан', self.run_benchmark(baseline))
+        with open(baseline, encoding='utf-8') as file:
+            recorded = json.load(file)
+        self.assertEqual(list(recorded), ['txt:10'])
+
+        output = self.run_benchmark(baseline)
+        self.assertIn('было', output)
+        self.assertNotIn('Базовый замер записан', output)
+        with open(baseline, encoding='utf-8') as file:
+            self.assertEqual(json.load(file), recorded)
@@ -0,0 +1,211 @@
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from api.metrics import get_route, observe_request
+from api.slow_queries import schedule_slow_queries
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Время и SQL-запросы одного HTTP-запроса.
+
+    Экземпляр подключается к соединениям как execute_wrapper: на каждый
+    запрос к базе уходит один вызов perf_counter и добавление в список.
+    Запросы дольше SLOW_QUERY_MS откладываются вместе с параметрами для
+    api.slow_queries.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = defaultdict(float)
+        self.queries = 0
+        self.db = 0.0
+        self.query_log = []
+        self.max_logged = settings.SLOW_REQUEST_MAX_QUERIES
+        self.slow_queries = []
+        self.slow_query_threshold = (
+            settings.SLOW_QUERY_MS / 1000 if settings.SLOW_QUERIES
+            else float('inf'))
+        self.view_started = None
+        self.view_finished = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db += duration
+            if len(self.query_log) < self.max_logged:
+                self.query_log.append((sql, duration))
+            if duration >= self.slow_query_threshold:
+                # У executemany нет одного набора параметров для EXPLAIN.
+                self.slow_queries.append(
+                    (sql, None if many else params, duration, not many))
+
+    def finish(self):
+        """Закрывает отрезки total, view, render и db.
+
+        Отрезки вложены друг в друга: view включает SQL-запросы и
+        сериализацию из неё (db и serializer), render — только рендеринг
+        ответа после выхода из view.
+        """
+        finished = time.perf_counter()
+        self.spans['total'] = finished - self.started
+        if self.view_started is not None:
+            view_finished = self.view_finished or finished
+            self.spans['view'] = view_finished - self.view_started
+        if self.view_finished is not None:
+            # DRF рендерит ответ после выхода из view: здесь JSON-рендерер,
+            # сериализаторы к этому моменту уже отработали.
+            self.spans['render'] = finished - self.view_finished
+        self.spans['db'] = self.db
+
+    def as_header(self):
+        parts = [f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"']
+        parts.extend(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.spans.items() if name != 'db'
+        )
+        return ', '.join(parts)
+
+    def as_dict(self):
+        data = {
+            f'{name}_ms': round(duration * 1000, 1)
+            for name, duration in self.spans.items()
+        }
+        data['queries'] = self.queries
+        return data
+
+
+@contextmanager
+def span(name):
+    """Добавляет время блока к отрезку name текущего запроса.
+
+    Вне запроса, например в пуле потоков, ничего не делает. Работает и
+    как декоратор.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.spans[name] += time.perf_counter() - started
+
+
+class SerializerTimingMixin:
+    """Добавляет время serializer.data к отрезку serializer.
+
+    Миксин для viewset'ов: сериализаторы из get_serializer() получают
+    подкласс с замером свойства data. Вложенные сериализаторы data не
+    вызывают и отдельно не считаются.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if _current.get() is not None:
+            serializer.__class__ = get_timed_serializer_class(
+                type(serializer))
+        return serializer
+
+
+_timed_serializer_classes = {}
+
+
+def get_timed_serializer_class(serializer_class):
+    if serializer_class not in _timed_serializer_classes:
+
+        class TimedSerializer(serializer_class):
+
+            @property
+            def data(self):
+                with span('serializer'):
+                    return super().data
+
+        TimedSerializer.__name__ = serializer_class.__name__
+        TimedSerializer.__qualname__ = serializer_class.__qualname__
+        _timed_serializer_classes[serializer_class] = TimedSerializer
+    return _timed_serializer_classes[serializer_class]
+
+
+class ServerTimingMiddleware:
+    """Замеряет запрос и отдаёт результат в заголовке Server-Timing.
+
+    Отрезки: db — SQL-запросы, serializer — serializer.data во view с
+    SerializerTimingMixin, view — view вместе с её запросами и сериализацией,
+    render — рендеринг ответа DRF после view, total — весь запрос, а
+    также отрезки из span(), например pdf. Отрезки db и serializer входят
+    в view и пересекаются между собой, поэтому не складываются. Для
+    каждого запроса пишется строка JSON в лог api.timing; медленные
+    запросы с вероятностью SLOW_REQUEST_SAMPLE_RATE пишутся вместе со
+    списком SQL. При settings.METRICS замер попадает и в метрики
+    api.metrics, медленные SQL-запросы после ответа сохраняются в
+    api.slow_queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        timings.finish()
+        response['Server-Timing'] = timings.as_header()
+        self.log(request, response, timings)
+        if settings.METRICS:
+            observe_request(request, response, timings.spans['total'],
+                            timings.queries)
+        if timings.slow_queries:
+            schedule_slow_queries(get_route(request), timings.slow_queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _current.get().view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Вызывается последним перед render(), если middleware стоит
+        # первым в списке.
+        _current.get().view_finished = time.perf_counter()
+        return response
+
+    def log(self, request, response, timings):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'route': get_route(request),
+            'status': response.status_code,
+            'user': getattr(getattr(request, 'user', None), 'pk', None),
+            **timings.as_dict(),
+        }
+        slow = (timings.spans['total'] * 1000
+                >= settings.SLOW_REQUEST_MS)
+        if slow and random.random() < settings.SLOW_REQUEST_SAMPLE_RATE:
+            record['sql'] = [
+                {'sql': sql, 'ms': round(duration * 1000, 1)}
+                for sql, duration in timings.query_log
+            ]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
@@ -5,6 +5,7 @@ from rest_framework.routers import DefaultRouter
 
 from users.views import CustomUserViewSet, custom_obtain_auth_token
 
+from .metrics import metrics
 from .views import IngredientsViewSet, RecipesViewSet, TagViewSet
 
 v1_router = DefaultRouter()
@@ -15,6 +16,7 @@ v1_router.register('users', CustomUserViewSet, basename='customuser')
 
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
     path('auth/token/login/', custom_obtain_auth_token),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include(v1_router.urls)),
@@ -1,17 +1,33 @@
-from django.http import HttpResponse
+import csv
+import json
+from functools import lru_cache
+
+from django.conf import settings
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from api.metrics import PDF_RENDER_DURATION
+from api.timing import span
+
+FONT_PATH = settings.BASE_DIR / 'data' / 'FreeSans.ttf'
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    # Разбор TTF занимает больше времени, чем сама генерация небольшого
+    # списка, поэтому шрифт регистрируется один раз на процесс.
+    pdfmetrics.registerFont(TTFont('FreeSans', str(FONT_PATH)))
 
-def generate_pdf(ingredients):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="shoping-list.pdf"'
 
-    pdfmetrics.registerFont(TTFont('FreeSans', 'data/FreeSans.ttf'))
+@PDF_RENDER_DURATION.time()
+@span('pdf')
+def render_pdf(ingredients, file):
+    """Рисует список покупок в PDF и записывает его в file."""
+    register_fonts()
 
-    canvas_obj = canvas.Canvas(response, pagesize=A4)
+    canvas_obj = canvas.Canvas(file, pagesize=A4)
     canvas_obj.setTitle('СПИСОК ПОКУПОК')
 
     begin_position_x, begin_position_y = 30, 750
@@ -43,4 +59,42 @@ def generate_pdf(ingredients):
     canvas_obj.showPage()
     canvas_obj.save()
 
-    return response
+
+class Echo:
+    """Файлоподобный объект, который возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_text(ingredients):
+    yield 'Список покупок:\n'
+    for number, item in enumerate(ingredients, start=1):
+        yield f'№{number}: {item["name"]} - {item["total"]} {item["unit"]}\n'
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in ingredients:
+        yield writer.writerow((item['name'], item['unit'], item['total']))
+
+
+def iter_json(ingredients):
+    separator = '['
+    for item in ingredients:
+        yield separator + json.dumps({
+            'name': item['name'],
+            'measurement_unit': item['unit'],
+            'amount': item['total'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+# Потоковые форматы списка покупок: генератор, Content-Type, расширение.
+STREAM_FORMATS = {
+    'txt': (iter_text, 'text/plain; charset=utf-8', 'txt'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8', 'csv'),
+    'json': (iter_json, 'application/json', 'json'),
+}
@@ -1,43 +1,90 @@
-from django.db.models import F, Sum
+from django.conf import settings
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from api.cache import (INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY,
+                       AnonymousCacheMixin)
+from api.conditional import (RecipeConditionalMixin,
+                             TableVersionConditionalMixin)
+from api.exports import (DONE, PENDING, export_response, get_export_status,
+                         start_export)
 from api.filters import IngredientsFilter, RecipeFilter
+from api.ingredient_index import ingredient_index
 from api.permissions import IsAuthorOrAdminPermission
 from api.serializers import (FavoriteCreateSerializer,
                              FavoriteDeleteSerializer, IngredientsSerializer,
-                             RecipeCreateUpdateSerializer, RecipeSerializer,
-                             ShoppingCartCreateSerializer,
+                             RecipeCreateUpdateSerializer, RecipeIdsSerializer,
+                             RecipeSerializer, ShoppingCartCreateSerializer,
                              ShoppingCartDeleteSerializer, TagSerializer)
-from recipes.models import Ingredient, Recipe, RecipeIngredients, Tag
-from users.pagination import CustomPageNumberPagination
+from api.timing import SerializerTimingMixin, span
+from recipes.models import (Favorite, Ingredient, Recipe, Shopping_cart,
+                            ShoppingListIngredient, Tag)
+from users.pagination import RecipePagination
 
-from .utils import generate_pdf
+from .utils import STREAM_FORMATS
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(AnonymousCacheMixin, TableVersionConditionalMixin,
+                 SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     pagination_class = None
+    table_version_key = TAGS_VERSION_KEY
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(TableVersionConditionalMixin, SerializerTimingMixin,
+                         viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientsSerializer
     queryset = Ingredient.objects.all()
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientsFilter
+    table_version_key = INGREDIENTS_VERSION_KEY
 
+    def get_limit(self):
+        limit = self.request.query_params.get('limit')
+        if limit and limit.isdigit():
+            return int(limit)
+        return None
 
-class RecipesViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.search_list, request, *args, **kwargs)
+
+    def search_list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        limit = self.get_limit()
+        if name and settings.INGREDIENT_PREFIX_INDEX:
+            return Response(ingredient_index.search(name, limit))
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if limit is not None:
+            queryset = queryset[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+class RecipesViewSet(AnonymousCacheMixin, RecipeConditionalMixin,
+                     SerializerTimingMixin, viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
-    pagination_class = CustomPageNumberPagination
+    pagination_class = RecipePagination
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.request.method not in SAFE_METHODS:
+            # Ответ на запись сериализатор строит заново, поэтому
+            # связанные данные и флаги здесь не нужны.
+            return Recipe.objects.all()
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user)
+
     def get_serializer_class(self):
         if self.request.method != 'GET':
             return RecipeCreateUpdateSerializer
@@ -45,8 +92,10 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return RecipeSerializer
 
     def get_permissions(self):
-        if self.request.method == 'GET':
+        if self.action in ('list', 'retrieve'):
             return (AllowAny(),)
+        if self.request.method == 'GET':
+            return super().get_permissions()
         return (IsAuthorOrAdminPermission(),)
 
     @staticmethod
@@ -58,7 +107,9 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status_code)
+            with span('serializer'):
+                data = serializer.data
+            return Response(data, status=status_code)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -78,6 +129,35 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def get_serializer_data(self, pk):
         return {'recipe_id': pk}
 
+    def handle_batch_request(self, model, request):
+        """Добавляет (POST) или удаляет (DELETE) пачку рецептов.
+
+        Запись идёт одним INSERT или DELETE, недобавленные id проверяются
+        одним запросом; для каждого id возвращается свой статус.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            done = model.objects.add_many(request.user.id, recipe_ids)
+            done_status, skipped_status = 'added', 'already_added'
+        else:
+            done = model.objects.remove_many(request.user.id, recipe_ids)
+            done_status, skipped_status = 'removed', 'not_added'
+
+        done = set(done)
+        skipped = [pk for pk in recipe_ids if pk not in done]
+        existing = set(Recipe.objects.filter(
+            pk__in=skipped).values_list('id', flat=True)) if skipped else ()
+        results = [
+            {'id': pk,
+             'status': (done_status if pk in done
+                        else skipped_status if pk in existing
+                        else 'not_found')}
+            for pk in recipe_ids
+        ]
+        return Response({'results': results})
+
     @action(detail=True,
             permission_classes=[IsAuthenticated], methods=['POST'])
     def favorite(self, request, pk):
@@ -108,12 +188,108 @@ class RecipesViewSet(viewsets.ModelViewSet):
             ShoppingCartDeleteSerializer,
             serializer_data, status.HTTP_204_NO_CONTENT, request)
 
-    @action(detail=False, methods=('get',))
-    def download_shopping_cart(self, request):
-        ingredients = RecipeIngredients.objects.filter(
-            recipe__in_shopping_cart__user=request.user
+    @action(detail=False, url_path='favorite', methods=('post', 'delete'),
+            permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        return self.handle_batch_request(Favorite, request)
+
+    @action(detail=False, url_path='shopping_cart',
+            methods=('post', 'delete'), permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        return self.handle_batch_request(Shopping_cart, request)
+
+    def get_shopping_list_rows(self):
+        return ShoppingListIngredient.objects.filter(
+            user=self.request.user
         ).values(
             name=F('ingredient__name'),
-            unit=F('ingredient__measurement_unit')
-        ).order_by('name').annotate(total=Sum('amount'))
-        return generate_pdf(ingredients)
+            unit=F('ingredient__measurement_unit'),
+            total=F('amount')
+        ).order_by('name')
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,))
+    def download_shopping_cart(self, request):
+        # Параметр format уже занят DRF под выбор рендерера.
+        file_format = request.query_params.get('file_format', 'pdf')
+        if file_format in STREAM_FORMATS:
+            generator, content_type, extension = STREAM_FORMATS[file_format]
+            response = StreamingHttpResponse(
+                generator(self.get_shopping_list_rows().iterator()),
+                content_type=content_type,
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="shoping-list.{extension}"')
+            return response
+        if file_format != 'pdf':
+            return Response(
+                {'file_format': [
+                    'Допустимые форматы: pdf, ' + ', '.join(STREAM_FORMATS)
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = list(self.get_shopping_list_rows())
+        export_id, export_status = start_export(
+            request.user.pk, rows, sync=True)
+        if export_status == DONE:
+            response = export_response(request.user.pk, export_id)
+            if response is None:
+                # Файл удалили после проверки статуса: рисуем заново.
+                export_id, export_status = start_export(
+                    request.user.pk, rows, sync=True)
+                if export_status == DONE:
+                    response = export_response(request.user.pk, export_id)
+            if response is not None:
+                return response
+        if export_status == PENDING:
+            # Такой же список уже рисуется: файл появится по ссылке
+            # из статуса выгрузки.
+            return Response(self.get_export_data(export_id, export_status),
+                            status=status.HTTP_202_ACCEPTED)
+        return Response(
+            {'detail': 'Не удалось сформировать список покупок.'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    @action(detail=False, methods=('post',),
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_export(self, request):
+        export_id, export_status = start_export(
+            request.user.pk, list(self.get_shopping_list_rows()))
+        return Response(
+            self.get_export_data(export_id, export_status),
+            status=(status.HTTP_201_CREATED if export_status == DONE
+                    else status.HTTP_202_ACCEPTED)
+        )
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,),
+            url_path=r'shopping_cart_export/(?P<export_id>[0-9a-f]{64})')
+    def shopping_cart_export_status(self, request, export_id):
+        export_status = get_export_status(request.user.pk, export_id)
+        if export_status is None:
+            return Response({'detail': 'Выгрузка не найдена.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_export_data(export_id, export_status))
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,),
+            url_path=r'shopping_cart_export/(?P<export_id>[0-9a-f]{64})/file')
+    def shopping_cart_export_file(self, request, export_id):
+        response = None
+        if get_export_status(request.user.pk, export_id) == DONE:
+            response = export_response(request.user.pk, export_id)
+        if response is None:
+            return Response({'detail': 'Файл не готов или устарел.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return response
+
+    def get_export_data(self, export_id, export_status):
+        data = {'id': export_id, 'status': export_status}
+        if export_status == DONE:
+            data['file'] = self.request.build_absolute_uri(reverse(
+                'recipe-shopping-cart-export-file',
+                kwargs={'export_id': export_id}
+            ))
+        return data
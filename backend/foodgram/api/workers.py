@@ -0,0 +1,21 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name):
+    """Пул потоков процесса для фоновых задач, например выгрузок.
+
+    Размер пула задаётся в settings.BACKGROUND_WORKERS[name].
+    """
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS[name],
+                thread_name_prefix=name,
+            )
+        return _executors[name]
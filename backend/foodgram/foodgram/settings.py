@@ -41,6 +41,58 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Замер времени и SQL-запросов каждого запроса (api.timing): заголовок
+# Server-Timing и строка JSON в лог api.timing. Middleware стоит первым,
+# чтобы замер охватывал весь запрос.
+REQUEST_TIMING = os.getenv('REQUEST_TIMING', 'True').lower() == 'true'
+if REQUEST_TIMING:
+    MIDDLEWARE.insert(0, 'api.timing.ServerTimingMiddleware')
+# Запросы дольше SLOW_REQUEST_MS с вероятностью SLOW_REQUEST_SAMPLE_RATE
+# пишутся в лог вместе с первыми SLOW_REQUEST_MAX_QUERIES SQL-запросами.
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', 0.1))
+SLOW_REQUEST_MAX_QUERIES = 100
+# Метрики Prometheus (api.metrics) на /api/metrics/. Замеры запросов
+# собирает тот же middleware, поэтому нужен и REQUEST_TIMING. Доступ —
+# staff или заголовок Authorization: Bearer METRICS_TOKEN.
+METRICS = os.getenv('METRICS', 'True').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# SQL-запросы дольше SLOW_QUERY_MS сохраняются в модель SlowQuery
+# (api.slow_queries) с отпечатком и view. Для доли
+# SLOW_QUERY_EXPLAIN_RATE сохраняется план EXPLAIN, на PostgreSQL для
+# SELECT — EXPLAIN ANALYZE, если он не отключён.
+SLOW_QUERIES = os.getenv('SLOW_QUERIES', 'True').lower() == 'true'
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.1))
+SLOW_QUERY_EXPLAIN_ANALYZE = os.getenv(
+    'SLOW_QUERY_EXPLAIN_ANALYZE', 'True').lower() == 'true'
+# Профиль запроса суперпользователя по заголовку X-Profile или параметру
+# _profile (api.profiling), хранится в админке. memory включает
+# tracemalloc. Хранятся REQUEST_PROFILE_KEEP последних профилей не старше
+# REQUEST_PROFILE_MAX_AGE_DAYS, данные .prof — не больше MAX_SIZE байт.
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'True').lower() == 'true'
+if REQUEST_PROFILING:
+    MIDDLEWARE.append('api.profiling.RequestProfileMiddleware')
+REQUEST_PROFILE_MAX_SIZE = 5 * 1024 * 1024
+REQUEST_PROFILE_KEEP = 50
+REQUEST_PROFILE_MAX_AGE_DAYS = 7
+REQUEST_PROFILE_SUMMARY_LINES = 40
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -74,6 +126,35 @@ DATABASES = {
 }
 
 
+# Кэш ответов API для анонимных пользователей (api.cache).
+# locmem хранит данные внутри процесса, file — общий для всех воркеров.
+API_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': API_CACHE_BACKENDS[os.getenv('API_CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.getenv('API_CACHE_LOCATION', '/tmp/foodgram_api_cache'),
+        'TIMEOUT': int(os.getenv('API_CACHE_TIMEOUT', 300)),
+    },
+}
+
+# Версии данных для кэша API, ETag и индекса ингредиентов хранятся в базе
+# (api.models.DataVersion) и видны всем процессам; изменения из другого
+# процесса становятся заметны не позже чем через DATA_VERSION_TTL секунд.
+DATA_VERSION_TTL = float(os.getenv('DATA_VERSION_TTL', 1))
+
+# Автодополнение ингредиентов по индексу в памяти процесса
+# (api.ingredient_index) вместо запроса istartswith к базе.
+INGREDIENT_PREFIX_INDEX = os.getenv(
+    'INGREDIENT_PREFIX_INDEX', 'True').lower() == 'true'
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -106,6 +187,35 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = 'https://f00dgram.onthewifi.com/media/'
 MEDIA_ROOT = '/media/'
 
+# Готовые PDF со списками покупок (api.exports), имя файла — хэш содержимого.
+SHOPPING_LIST_EXPORT_ROOT = os.path.join(MEDIA_ROOT, 'exports')
+# Префикс internal-location nginx для X-Accel-Redirect, например
+# /media/exports/. Если пуст, файл отдаёт сам Django.
+SHOPPING_LIST_EXPORT_ACCEL_URL = os.getenv('SHOPPING_LIST_EXPORT_ACCEL_URL', '')
+# Списки не длиннее этого числа строк рисуются прямо в запросе.
+SHOPPING_LIST_SYNC_MAX_ROWS = int(os.getenv('SHOPPING_LIST_SYNC_MAX_ROWS', 100))
+SHOPPING_LIST_EXPORT_TIMEOUT = 600
+# Выгрузки старше SHOPPING_LIST_EXPORT_MAX_AGE секунд удаляются после
+# новых выгрузок не чаще раза в SHOPPING_LIST_EXPORT_SWEEP_INTERVAL секунд
+# и командой clear_shopping_list_exports.
+SHOPPING_LIST_EXPORT_MAX_AGE = int(
+    os.getenv('SHOPPING_LIST_EXPORT_MAX_AGE', 24 * 3600))
+SHOPPING_LIST_EXPORT_SWEEP_INTERVAL = 3600
+
+# Размеры пулов потоков для фоновых задач (api.workers).
+BACKGROUND_WORKERS = {
+    'shopping-list-export': int(
+        os.getenv('SHOPPING_LIST_EXPORT_WORKERS', 2)),
+    'recipe-images': int(os.getenv('RECIPE_IMAGE_WORKERS', 2)),
+    'slow-queries': 1,
+}
+
+# Ограничения на загружаемые в base64 изображения рецептов.
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+# Тело JSON с картинкой в base64 на треть больше самой картинки.
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 3 // 2
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
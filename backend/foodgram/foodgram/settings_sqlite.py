@@ -0,0 +1,43 @@
+"""Профиль настроек для бенчмарков без PostgreSQL.
+
+    DJANGO_SETTINGS_MODULE=foodgram.settings_sqlite \
+        python manage.py benchmark_api --output results.json
+"""
+import os
+import tempfile
+
+from foodgram.settings import *  # noqa: F401, F403
+
+BENCHMARK_ROOT = os.getenv(
+    'BENCHMARK_ROOT', os.path.join(tempfile.gettempdir(), 'foodgram-bench'))
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BENCHMARK_ROOT, 'db.sqlite3'),
+    }
+}
+
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+DEBUG = False
+
+MEDIA_ROOT = os.path.join(BENCHMARK_ROOT, 'media')
+SHOPPING_LIST_EXPORT_ROOT = os.path.join(MEDIA_ROOT, 'exports')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-api',
+    },
+}
+
+# Строки api.timing на каждый запрос заглушили бы вывод бенчмарка.
+LOGGING['loggers']['api.timing']['level'] = 'ERROR'  # noqa: F405
+
+# Бенчмарк работает в одном процессе, и bump_generation сбрасывает
+# запомненную версию сам. Чтение версии из базы по таймеру сделало бы
+# число запросов зависимым от скорости машины.
+DATA_VERSION_TTL = 3600
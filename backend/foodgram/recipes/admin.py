@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from .models import Favorite, Ingredient, Recipe, Shopping_cart, Tag
+from users.models import UserStats
+
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredients,
+                     Shopping_cart, ShoppingListIngredient, Tag)
 
 
 @admin.register(Ingredient)
@@ -30,14 +33,51 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @admin.display(description='В избранном')
     def in_favorite_count(self, obj):
-        return obj.in_favorite.count()
+        return obj.favorites_count
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Сигнал считает только новые рецепты, при смене автора счётчики
+        # обоих авторов пересчитываются.
+        if change and 'author' in form.changed_data:
+            UserStats.recount(obj.author_id, form.initial.get('author'))
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = (
+            RecipeIngredients.amounts(form.instance) if change else {})
+        super().save_related(request, form, formsets, change)
+        if change:
+            ShoppingListIngredient.objects.change_recipe(
+                form.instance, old_amounts)
 
 
 @admin.register(Shopping_cart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Добавление и удаление обрабатывают сигналы, а при правке строки
+        # корзины списки затронутых пользователей пересобираются.
+        if change:
+            ShoppingListIngredient.objects.rebuild(
+                users=[obj.user_id, form.initial.get('user', obj.user_id)])
+
+
+@admin.register(ShoppingListIngredient)
+class ShoppingListIngredientAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    list_select_related = ('user', 'ingredient')
+    search_fields = ('user__username',)
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Сигналы обрабатывают добавление и удаление, а при правке строки
+        # счётчики затронутых рецептов пересчитываются.
+        if change and 'recipe' in form.changed_data:
+            Recipe.recount_favorites(obj.recipe_id, form.initial.get('recipe'))
@@ -0,0 +1,235 @@
+import random
+import time
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import (GENERATION_KEY, INGREDIENTS_VERSION_KEY,
+                       TAGS_VERSION_KEY, bump_generation)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredients,
+                            Shopping_cart, ShoppingListIngredient, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def zipf_cum_weights(size, skew):
+    """Накопленные веса степенного распределения для size элементов."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+
+def skewed_sample(rng, population, cum_weights, size):
+    """До size разных элементов, популярные выпадают чаще."""
+    if size <= 0:
+        return []
+    picked = dict.fromkeys(
+        rng.choices(population, cum_weights=cum_weights, k=size * 2))
+    return list(islice(picked, size))
+
+
+def count_around(rng, mean, limit):
+    """Случайное количество со средним mean и длинным хвостом."""
+    if mean <= 0:
+        return 0
+    return min(int(rng.expovariate(1 / mean)), limit)
+
+
+class Command(BaseCommand):
+    help = ('Генерирует пользователей, теги, рецепты, избранное, корзины '
+            'и подписки для нагрузочного тестирования. Авторы и рецепты '
+            'выбираются по степенному закону, данные повторяются при '
+            'одинаковом --seed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=12)
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help=('Минимальный размер каталога ингредиентов; недостающие '
+                  'ингредиенты создаются.'),
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Среднее число ингредиентов в рецепте.',
+        )
+        parser.add_argument(
+            '--favorites-per-user', type=int, default=20,
+            help='Среднее число рецептов в избранном.',
+        )
+        parser.add_argument(
+            '--carts-per-user', type=int, default=5,
+            help='Среднее число рецептов в корзине.',
+        )
+        parser.add_argument(
+            '--subscriptions-per-user', type=int, default=10,
+            help='Среднее число подписок.',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help=('Показатель степенного закона для авторов и популярности '
+                  'рецептов: чем больше, тем сильнее перекос.'),
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--prefix', default='load',
+            help='Префикс имён, по которому сгенерированные данные '
+                 'отличаются от настоящих.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.created = {}
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                'укажите другой --prefix.')
+        started = time.perf_counter()
+
+        user_ids = self.create_users()
+        tag_ids = self.create_tags()
+        ingredient_ids = self.create_ingredients()
+        recipe_ids = self.create_recipes(user_ids, tag_ids, ingredient_ids)
+        self.create_user_recipes(Favorite, 'favorites_per_user',
+                                 user_ids, recipe_ids)
+        self.create_user_recipes(Shopping_cart, 'carts_per_user',
+                                 user_ids, recipe_ids)
+        self.create_subscriptions(user_ids)
+
+        # bulk_create не вызывает сигналы: счётчики, списки покупок и
+        # версии кэша API обновляются здесь.
+        call_command('rebuild_counters', stdout=self.stdout)
+        ShoppingListIngredient.objects.rebuild(
+            User.objects.filter(username__startswith=f'{prefix}_'))
+        for key in (GENERATION_KEY, TAGS_VERSION_KEY,
+                    INGREDIENTS_VERSION_KEY):
+            bump_generation(key)
+
+        summary = ', '.join(
+            f'{name}: {count}' for name, count in self.created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.perf_counter() - started:.1f} с — {summary}.'))
+
+    def bulk_create(self, model, objects, label):
+        batch_size = self.options['batch_size']
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(islice(objects, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        self.created[label] = total
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        # Хэш пароля считается один раз: это самая дорогая часть.
+        password = make_password(prefix)
+        self.bulk_create(User, (
+            User(username=f'{prefix}_{number}',
+                 email=f'{prefix}_{number}@example.com',
+                 first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+                 password=password)
+            for number in range(self.options['users'])
+        ), 'пользователей')
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_tags(self):
+        prefix = self.options['prefix']
+        self.bulk_create(Tag, (
+            # Умножение на нечётное число по модулю 2**24 даёт разные цвета.
+            Tag(name=f'{prefix} тег {number}',
+                slug=f'{prefix}-tag-{number}',
+                color=f'#{number * 2654435761 % 0x1000000:06X}')
+            for number in range(self.options['tags'])
+        ), 'тегов')
+        return list(Tag.objects.filter(
+            slug__startswith=f'{prefix}-tag-').values_list('id', flat=True))
+
+    def create_ingredients(self):
+        missing = self.options['ingredients'] - Ingredient.objects.count()
+        prefix = self.options['prefix']
+        self.bulk_create(Ingredient, (
+            Ingredient(name=f'{prefix} ингредиент {number}',
+                       measurement_unit=self.rng.choice(('г', 'мл', 'шт')))
+            for number in range(max(missing, 0))
+        ), 'ингредиентов')
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+
+    def create_recipes(self, user_ids, tag_ids, ingredient_ids):
+        rng = self.rng
+        prefix = self.options['prefix']
+        authors = list(user_ids)
+        rng.shuffle(authors)
+        author_weights = zipf_cum_weights(len(authors), self.options['skew'])
+        self.bulk_create(Recipe, (
+            Recipe(name=f'{prefix} рецепт {number}',
+                   text='Описание рецепта. ' * rng.randint(1, 30),
+                   cooking_time=rng.randint(5, 180),
+                   author_id=author)
+            for number, author in enumerate(rng.choices(
+                authors, cum_weights=author_weights,
+                k=self.options['recipes']))
+        ), 'рецептов')
+        recipe_ids = list(Recipe.objects.filter(
+            name__startswith=f'{prefix} рецепт '
+        ).order_by('id').values_list('id', flat=True))
+
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(
+                tag_ids, min(rng.randint(1, 3), len(tag_ids)))
+        ), 'тегов рецептов')
+
+        mean = self.options['ingredients_per_recipe']
+        self.bulk_create(RecipeIngredients, (
+            RecipeIngredients(recipe_id=recipe_id, ingredient_id=ingredient,
+                              amount=rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient in rng.sample(ingredient_ids, min(
+                max(1, round(rng.gauss(mean, mean / 3))),
+                3 * mean, len(ingredient_ids)))
+        ), 'ингредиентов рецептов')
+        return recipe_ids
+
+    def create_user_recipes(self, model, option, user_ids, recipe_ids):
+        rng = self.rng
+        popular = list(recipe_ids)
+        rng.shuffle(popular)
+        weights = zipf_cum_weights(len(popular), self.options['skew'])
+        mean = self.options[option]
+        self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in skewed_sample(
+                rng, popular, weights,
+                count_around(rng, mean, len(popular)))
+        ), model._meta.verbose_name_plural.lower())
+
+    def create_subscriptions(self, user_ids):
+        rng = self.rng
+        authors = list(user_ids)
+        rng.shuffle(authors)
+        weights = zipf_cum_weights(len(authors), self.options['skew'])
+        mean = self.options['subscriptions_per_user']
+        self.bulk_create(Subscription, (
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in skewed_sample(
+                rng, authors, weights,
+                count_around(rng, mean, len(authors)))
+            if author_id != user_id
+        ), 'подписок')
@@ -1,23 +1,143 @@
 import csv
+import json
+import re
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from api.cache import INGREDIENTS_VERSION_KEY, bump_generation
 from recipes.models import Ingredient
 
+FORMATS = ('csv', 'json', 'jsonl')
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+def iter_json_array(file):
+    """Читает JSON-массив объектов по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON-файл должен содержать массив объектов.')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('JSON-файл оборван или повреждён.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+def iter_json_lines(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_json(file, reader):
+    for item in reader(file):
+        if isinstance(item, dict):
+            yield item.get('name', ''), item.get('measurement_unit', '')
+        else:
+            yield None, None
+
 
 class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV (название, единица) или JSON '
+            '(массив либо JSON Lines объектов name/measurement_unit). '
+            'Повторный запуск не создаёт дубликатов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='data/ingredients.csv',
+            help='Путь к файлу, по умолчанию data/ingredients.csv.',
+        )
+        parser.add_argument(
+            '--format', dest='file_format', choices=FORMATS,
+            help='Формат файла; по умолчанию берётся из расширения.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять одним запросом.',
+        )
 
     def handle(self, *args, **options):
-        with open('data/ingredients.csv', 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                try:
-                    item = None
-                    item = Ingredient(name=row[0], measurement_unit=row[1])
-                    item.full_clean()
-                    item.save()
-                    self.stdout.write(self.style.SUCCESS(
-                        f"Запись успешно добавлена: {row}"))
-                except Exception as error:
-                    self.stdout.write(self.style.ERROR(
-                        f'Ошибка в строке {row}: {error}'))
+        path = Path(options['path'])
+        file_format = options['file_format'] or path.suffix.lstrip('.')
+        if file_format not in FORMATS:
+            raise CommandError(
+                f'Не удалось определить формат файла {path}, '
+                f'укажите --format ({", ".join(FORMATS)}).')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit').max_length
+        stats = {'read': 0, 'invalid': 0, 'repeated': 0}
+        seen = set()
+        started = time.perf_counter()
+        total_before = Ingredient.objects.count()
+
+        def valid_ingredients(rows):
+            for name, unit in rows:
+                stats['read'] += 1
+                name = (name or '').strip()
+                unit = (unit or '').strip()
+                if (not name or not unit or len(name) > name_length
+                        or len(unit) > unit_length):
+                    stats['invalid'] += 1
+                    continue
+                if (name, unit) in seen:
+                    stats['repeated'] += 1
+                    continue
+                seen.add((name, unit))
+                yield Ingredient(name=name, measurement_unit=unit)
+
+        with path.open(encoding='utf-8', newline='') as file:
+            if file_format == 'csv':
+                rows = iter_csv(file)
+            elif file_format == 'json':
+                rows = iter_json(file, iter_json_array)
+            else:
+                rows = iter_json(file, iter_json_lines)
+            ingredients = valid_ingredients(rows)
+            while True:
+                batch = list(islice(ingredients, options['batch_size']))
+                if not batch:
+                    break
+                # Уже загруженные ингредиенты пропускает уникальный индекс
+                # (name, measurement_unit).
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                if self.stdout.isatty():
+                    self.stdout.write(
+                        f'\rПрочитано строк: {stats["read"]}', ending='')
+
+        created = Ingredient.objects.count() - total_before
+        if created:
+            bump_generation(INGREDIENTS_VERSION_KEY)
+        if self.stdout.isatty():
+            self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {stats["read"]}, добавлено: {created}, '
+            f'уже были в базе: {len(seen) - created}, '
+            f'повторов в файле: {stats["repeated"]}, '
+            f'с ошибками: {stats["invalid"]} '
+            f'за {time.perf_counter() - started:.1f} с.'
+        ))
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import UserStats
+
+User = get_user_model()
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики Recipe.favorites_count и '
+            'UserStats.recipes_count.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счётчики, ничего не изменяя.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.annotate(
+            actual=count_subquery(Favorite, 'recipe')
+        ).exclude(favorites_count=F('actual'))
+        users = User.objects.annotate(
+            actual=count_subquery(Recipe, 'author'),
+            stored=Coalesce('stats__recipes_count', 0),
+        ).exclude(stored=F('actual'))
+
+        broken_recipes = recipes.count()
+        broken_users = users.count()
+        self.stdout.write(
+            f'Рецептов с неверным favorites_count: {broken_recipes}, '
+            f'авторов с неверным recipes_count: {broken_users}'
+        )
+        if options['check']:
+            if broken_recipes or broken_users:
+                raise CommandError('Счётчики не совпадают с данными.')
+            return
+
+        with transaction.atomic():
+            Recipe.objects.update(
+                favorites_count=count_subquery(Favorite, 'recipe'))
+            UserStats.objects.bulk_create(
+                (UserStats(user_id=pk) for pk in User.objects.filter(
+                    stats__isnull=True).values_list('pk', flat=True)),
+                batch_size=1000,
+            )
+            UserStats.objects.update(
+                recipes_count=Coalesce(Subquery(
+                    Recipe.objects.filter(
+                        author=OuterRef('user')
+                    ).order_by().values('author').annotate(
+                        total=Count('pk')).values('total')
+                ), 0)
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
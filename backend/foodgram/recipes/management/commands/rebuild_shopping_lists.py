@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    help = ('Проверяет и пересобирает суммы ингредиентов в списках '
+            'покупок по корзинам пользователей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить списки, ничего не изменяя.',
+        )
+        parser.add_argument(
+            '--user', type=int, nargs='+', dest='users',
+            help='Id пользователей, чьи списки нужно обработать.',
+        )
+
+    def find_broken_users(self, users):
+        stored = ShoppingListIngredient.objects.all()
+        if users is not None:
+            stored = stored.filter(user__in=users)
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in stored.values_list(
+                'user_id', 'ingredient_id', 'amount').iterator()
+        }
+        broken = set()
+        for row in ShoppingListIngredient.objects.aggregated(
+                users).iterator():
+            key = (row['user_id'], row['ingredient_pk'])
+            if stored.pop(key, None) != row['total']:
+                broken.add(row['user_id'])
+        broken.update(user_id for user_id, _ in stored)
+        return broken
+
+    def handle(self, *args, **options):
+        users = options['users']
+        broken = self.find_broken_users(users)
+        self.stdout.write(
+            f'Пользователей с расхождениями в списке покупок: {len(broken)}')
+        if options['check']:
+            if broken:
+                raise CommandError(
+                    'Списки покупок не совпадают с корзинами: '
+                    + ', '.join(map(str, sorted(broken))))
+            return
+
+        with transaction.atomic():
+            ShoppingListIngredient.objects.rebuild(users)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны.'))
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+INDEX_NAME = 'recipes_ingredient_name_prefix_idx'
+
+
+def create_prefix_index(apps, schema_editor):
+    # istartswith в PostgreSQL превращается в UPPER(name::text) LIKE ...,
+    # такой запрос может использовать только индекс по тому же выражению
+    # с text_pattern_ops.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        '(UPPER(name::text) text_pattern_ops)'
+    )
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
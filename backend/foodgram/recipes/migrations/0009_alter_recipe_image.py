@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-17 18:50
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Изображение для рецепта', storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/', verbose_name='Изображение для рецепта'),
+        ),
+    ]
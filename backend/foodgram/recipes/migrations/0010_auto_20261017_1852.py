@@ -0,0 +1,75 @@
+# Generated by Django 3.2.16 on 2026-10-17 18:52
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicates(model):
+    """Оставляет по одной строке на пару (user, recipe).
+
+    Возвращает id пользователей, у которых были повторы.
+    """
+    duplicates = model.objects.values('user_id', 'recipe_id').annotate(
+        keep=Min('id'), total=Count('id')).filter(total__gt=1).order_by()
+    users = set()
+    for row in duplicates.iterator():
+        model.objects.filter(
+            user_id=row['user_id'], recipe_id=row['recipe_id']
+        ).exclude(id=row['keep']).delete()
+        users.add(row['user_id'])
+    return users
+
+
+def deduplicate(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Shopping_cart = apps.get_model('recipes', 'Shopping_cart')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    ShoppingListIngredient = apps.get_model(
+        'recipes', 'ShoppingListIngredient')
+
+    if delete_duplicates(Favorite):
+        counts = Favorite.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            total=Count('pk')).values('total')
+        Recipe.objects.update(favorites_count=Coalesce(Subquery(counts), 0))
+
+    users = delete_duplicates(Shopping_cart)
+    if users:
+        # Повторы корзины учитывались в списке покупок дважды.
+        ShoppingListIngredient.objects.filter(user_id__in=users).delete()
+        rows = RecipeIngredients.objects.filter(
+            recipe__in_shopping_cart__user__in=users
+        ).values(
+            user_pk=F('recipe__in_shopping_cart__user'),
+            ingredient_pk=F('ingredient_id'),
+        ).annotate(total=Sum('amount')).order_by()
+        ShoppingListIngredient.objects.bulk_create(
+            (ShoppingListIngredient(
+                user_id=row['user_pk'],
+                ingredient_id=row['ingredient_pk'],
+                amount=row['total'])
+             for row in rows.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_alter_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shopping_cart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 3.2.16 on 2026-10-17 18:54
+
+from django.db import migrations
+from django.db.models import Count, F, Min, Sum
+
+
+# Наибольшее значение PositiveSmallIntegerField на всех СУБД.
+MAX_AMOUNT = 32767
+
+
+def merge_recipe_lines(RecipeIngredients, ingredient_id):
+    """Оставляет одну строку ингредиента на рецепт с суммой количеств."""
+    groups = RecipeIngredients.objects.filter(
+        ingredient_id=ingredient_id
+    ).values('recipe_id').annotate(
+        first=Min('id'), total=Sum('amount'), lines=Count('id')
+    ).filter(lines__gt=1).order_by()
+    for group in list(groups):
+        RecipeIngredients.objects.filter(id=group['first']).update(
+            amount=min(group['total'], MAX_AMOUNT))
+        RecipeIngredients.objects.filter(
+            recipe_id=group['recipe_id'], ingredient_id=ingredient_id
+        ).exclude(id=group['first']).delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сводит одинаковые (name, measurement_unit) к ингредиенту с меньшим id.
+
+    Рецепты переводятся на оставшийся ингредиент; если в рецепте были
+    обе копии, их количества складываются в одну строку. Списки покупок
+    затронутых пользователей пересчитываются заново.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    ShoppingListIngredient = apps.get_model(
+        'recipes', 'ShoppingListIngredient')
+
+    duplicates = list(
+        Ingredient.objects.values('name', 'measurement_unit').annotate(
+            keep=Min('id'), total=Count('id')
+        ).filter(total__gt=1).order_by()
+    )
+    users = set()
+    for row in duplicates:
+        extra = list(Ingredient.objects.filter(
+            name=row['name'], measurement_unit=row['measurement_unit']
+        ).exclude(id=row['keep']).values_list('id', flat=True))
+        RecipeIngredients.objects.filter(
+            ingredient_id__in=extra).update(ingredient_id=row['keep'])
+        merge_recipe_lines(RecipeIngredients, row['keep'])
+        users.update(ShoppingListIngredient.objects.filter(
+            ingredient_id__in=extra).values_list('user_id', flat=True))
+        Ingredient.objects.filter(id__in=extra).delete()
+
+    if not users:
+        return
+    ShoppingListIngredient.objects.filter(user_id__in=users).delete()
+    rows = RecipeIngredients.objects.filter(
+        recipe__in_shopping_cart__user__in=users
+    ).values(
+        user_pk=F('recipe__in_shopping_cart__user'),
+        ingredient_pk=F('ingredient_id'),
+    ).annotate(total=Sum('amount')).order_by()
+    ShoppingListIngredient.objects.bulk_create(
+        (ShoppingListIngredient(
+            user_id=row['user_pk'],
+            ingredient_id=row['ingredient_pk'],
+            amount=row['total'])
+         for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_auto_20261017_1852'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
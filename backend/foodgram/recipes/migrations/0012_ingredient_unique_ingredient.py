@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-17 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Отдельная миграция: на PostgreSQL ALTER TABLE в одной транзакции
+    # с удалением ингредиентов падает с «pending trigger events».
+
+    dependencies = [
+        ('recipes', '0011_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
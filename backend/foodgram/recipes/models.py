@@ -1,7 +1,13 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.core.exceptions import EmptyResultSet
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (Case, Count, Exists, F, OuterRef, Prefetch, Sum,
+                              Value, When, Window)
+from django.db.models.functions import RowNumber
+
+from recipes.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -46,11 +52,92 @@ class Ingredient(models.Model):
         verbose_name = 'ингредиент'
         verbose_name_plural = 'ингредиенты'
         ordering = ('name',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    user_flags = ('is_favorited', 'is_in_shopping_cart')
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты для списка рецептов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredients_set',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient')
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart."""
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Shopping_cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def count(self):
+        """COUNT(*) без флагов из with_user_flags().
+
+        Django 3.2 переносит аннотации в подзапрос COUNT(*), и пагинатор
+        выполнял бы два коррелированных EXISTS на каждую строку выборки.
+        На число строк флаги не влияют, поэтому для подсчёта они
+        убираются.
+        """
+        if self._result_cache is not None or not any(
+                name in self.query.annotations for name in self.user_flags):
+            return super().count()
+        query = self.query.chain()
+        for name in self.user_flags:
+            query.annotations.pop(name, None)
+        if query.annotation_select_mask is not None:
+            query.set_annotation_mask(
+                query.annotation_select_mask - set(self.user_flags))
+        return query.get_count(using=self.db)
+
+    def first_per_author(self, limit):
+        """Первые limit рецептов каждого автора одним запросом.
+
+        Django 3.2 не умеет фильтровать по оконным функциям, поэтому
+        запрос с ROW_NUMBER() оборачивается в raw-подзапрос. Для заведомо
+        пустой выборки, например author__in=[], SQL не строится и
+        возвращается none().
+        """
+        ranked = self.order_by().annotate(author_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').asc()],
+        ))
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            return self.none()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked_recipes '
+            'WHERE author_rank <= %s ORDER BY pub_date DESC, id',
+            (*params, limit)
+        )
+
+    def image_references(self):
+        """Число рецептов на каждый файл изображения: {имя: ссылки}."""
+        return dict(
+            self.exclude(image='').order_by().values('image').annotate(
+                references=Count('id')).values_list('image', 'references')
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField(
         max_length=200,
@@ -74,11 +161,22 @@ class Recipe(models.Model):
         help_text='Изображение для рецепта',
         blank=True,
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
+    )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации рецепта',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения рецепта',
+        auto_now=True,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -91,6 +189,13 @@ class Recipe(models.Model):
         related_name='recipes',
         verbose_name='Теги рецепта',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
@@ -100,6 +205,14 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def recount_favorites(cls, *recipe_ids):
+        """Пересчитывает favorites_count рецептов по таблице избранного."""
+        for recipe_id in set(recipe_ids) - {None}:
+            cls.objects.filter(pk=recipe_id).update(
+                favorites_count=Favorite.objects.filter(
+                    recipe_id=recipe_id).count())
+
 
 class RecipeIngredients(models.Model):
     recipe = models.ForeignKey(
@@ -124,6 +237,118 @@ class RecipeIngredients(models.Model):
     def __str__(self):
         return f'В рецепте {self.recipe} есть ингредиент {self.ingredient}'
 
+    @classmethod
+    def amounts(cls, *recipes):
+        """Количество каждого ингредиента рецептов: {ingredient_id: amount}."""
+        amounts = {}
+        for ingredient_id, amount in cls.objects.filter(
+                recipe__in=recipes).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
+
+
+class UserRecipeQuerySet(models.QuerySet):
+    """Добавление и удаление пар (пользователь, рецепт) одним запросом.
+
+    Вставка и удаление идут мимо сигналов, поэтому зависимые данные
+    обновляют added() и removed() наследников; сигналы моделей вызывают
+    их же при сохранении и удалении через ORM.
+    """
+
+    def execute(self, sql, params):
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_columns(self):
+        quote_name = connections[self.db].ops.quote_name
+        meta = self.model._meta
+        return (
+            quote_name(meta.db_table),
+            quote_name(meta.get_field('user').column),
+            quote_name(meta.get_field('recipe').column),
+        )
+
+    def add_many(self, user_id, recipe_ids):
+        """Добавляет рецепты одним INSERT ... ON CONFLICT DO NOTHING.
+
+        Возвращает id добавленных рецептов: уже добавленные и
+        несуществующие в него не попадают.
+        """
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return []
+        table, user, recipe = self.get_columns()
+        quote_name = connections[self.db].ops.quote_name
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        sql = (
+            f'INSERT INTO {table} ({user}, {recipe}) '
+            f'SELECT %s, {quote_name("id")} '
+            f'FROM {quote_name(Recipe._meta.db_table)} '
+            f'WHERE {quote_name("id")} IN ({placeholders}) '
+            f'ON CONFLICT ({user}, {recipe}) DO NOTHING '
+            f'RETURNING {recipe}'
+        )
+        with transaction.atomic(using=self.db):
+            added = self.execute(sql, (user_id, *recipe_ids))
+            if added:
+                self.added(user_id, added)
+        return added
+
+    def remove_many(self, user_id, recipe_ids):
+        """Удаляет рецепты одним DELETE и возвращает id удалённых."""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return []
+        table, user, recipe = self.get_columns()
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        sql = (
+            f'DELETE FROM {table} '
+            f'WHERE {user} = %s AND {recipe} IN ({placeholders}) '
+            f'RETURNING {recipe}'
+        )
+        with transaction.atomic(using=self.db):
+            removed = self.execute(sql, (user_id, *recipe_ids))
+            if removed:
+                self.removed(user_id, removed)
+        return removed
+
+    def add(self, user_id, recipe_id):
+        """Возвращает True, если рецепт добавлен, и False, если он уже
+        был добавлен или не существует."""
+        return bool(self.add_many(user_id, [recipe_id]))
+
+    def remove(self, user_id, recipe_id):
+        """Возвращает True, если рецепт был добавлен и удалён."""
+        return bool(self.remove_many(user_id, [recipe_id]))
+
+    def added(self, user_id, recipe_ids):
+        pass
+
+    def removed(self, user_id, recipe_ids):
+        pass
+
+
+class FavoriteQuerySet(UserRecipeQuerySet):
+
+    def added(self, user_id, recipe_ids):
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            favorites_count=F('favorites_count') + 1)
+
+    def removed(self, user_id, recipe_ids):
+        Recipe.objects.filter(
+            pk__in=recipe_ids, favorites_count__gt=0
+        ).update(favorites_count=F('favorites_count') - 1)
+
+
+class ShoppingCartQuerySet(UserRecipeQuerySet):
+
+    def added(self, user_id, recipe_ids):
+        ShoppingListIngredient.objects.add_recipes(user_id, recipe_ids)
+
+    def removed(self, user_id, recipe_ids):
+        ShoppingListIngredient.objects.remove_recipes(user_id, recipe_ids)
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -139,10 +364,18 @@ class Favorite(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = FavoriteQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'избранное'
         verbose_name_plural = 'Избранное'
         ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite'
+            ),
+        )
 
     def __str__(self):
         return f'Рецепт {self.recipe} в избранном у {self.user}'
@@ -162,10 +395,128 @@ class Shopping_cart(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = ShoppingCartQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart'
+            ),
+        )
 
     def __str__(self):
         return f'Рецепт {self.recipe} в избранном у {self.user}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет deltas ({ingredient_id: delta}) к спискам user_ids."""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        self.bulk_create(
+            (ShoppingListIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=0)
+             for user_id in user_ids
+             for ingredient_id, delta in deltas.items() if delta > 0),
+            ignore_conflicts=True,
+        )
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        rows.update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            default=Value(0),
+        ))
+        rows.filter(amount__lte=0).delete()
+
+    def add_recipes(self, user_id, recipe_ids):
+        self.apply_deltas(
+            [user_id], RecipeIngredients.amounts(*recipe_ids))
+
+    def remove_recipes(self, user_id, recipe_ids):
+        self.apply_deltas(
+            [user_id],
+            {pk: -amount
+             for pk, amount in RecipeIngredients.amounts(
+                 *recipe_ids).items()}
+        )
+
+    def change_recipe(self, recipe, old_amounts, new_amounts=None):
+        """Переносит изменение ингредиентов рецепта в списки покупок."""
+        if new_amounts is None:
+            new_amounts = RecipeIngredients.amounts(recipe)
+        deltas = {
+            pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+            for pk in old_amounts.keys() | new_amounts.keys()
+        }
+        if not any(deltas.values()):
+            return
+        self.apply_deltas(
+            Shopping_cart.objects.filter(
+                recipe=recipe).values_list('user_id', flat=True),
+            deltas
+        )
+
+    def aggregated(self, users=None):
+        """Суммы ингредиентов, посчитанные заново по корзинам."""
+        rows = RecipeIngredients.objects.all()
+        if users is not None:
+            rows = rows.filter(recipe__in_shopping_cart__user__in=users)
+        else:
+            rows = rows.filter(recipe__in_shopping_cart__isnull=False)
+        return rows.values(
+            user_id=F('recipe__in_shopping_cart__user'),
+            ingredient_pk=F('ingredient_id'),
+        ).annotate(total=Sum('amount')).order_by('user_id', 'ingredient_pk')
+
+    def rebuild(self, users=None):
+        stored = self.all() if users is None else self.filter(user__in=users)
+        stored.delete()
+        self.bulk_create(
+            (ShoppingListIngredient(
+                user_id=row['user_id'],
+                ingredient_id=row['ingredient_pk'],
+                amount=row['total'])
+             for row in self.aggregated(users).iterator()),
+            batch_size=1000,
+        )
+
+
+class ShoppingListIngredient(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} ({self.amount}) в списке {self.user}'
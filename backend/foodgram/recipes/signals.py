@@ -0,0 +1,52 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Favorite, Recipe, Shopping_cart
+from users.models import UserStats
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        Favorite.objects.added(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    Favorite.objects.removed(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if not created:
+        return
+    updated = UserStats.objects.filter(user_id=instance.author_id).update(
+        recipes_count=F('recipes_count') + 1)
+    if not updated:
+        # Первая запись для автора: считаем рецепты целиком, уже с новым.
+        UserStats.objects.get_or_create(
+            user_id=instance.author_id,
+            defaults={'recipes_count': Recipe.objects.filter(
+                author_id=instance.author_id).count()}
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    UserStats.objects.filter(
+        user_id=instance.author_id, recipes_count__gt=0
+    ).update(recipes_count=F('recipes_count') - 1)
+
+
+@receiver(post_save, sender=Shopping_cart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        Shopping_cart.objects.added(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Shopping_cart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete отправляется до каскадного удаления, поэтому при удалении
+    # рецепта его ингредиенты ещё доступны.
+    Shopping_cart.objects.removed(instance.user_id, [instance.recipe_id])
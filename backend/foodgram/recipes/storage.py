@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под sha256 их содержимого.
+
+    Одинаковые файлы записываются на диск один раз: повторная загрузка
+    той же картинки возвращает имя уже сохранённого файла. Ссылки на
+    файл считаются по полям моделей, ненужные файлы удаляет команда
+    gc_recipe_images.
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            try:
+                # Новая дата изменения защищает файл от gc_recipe_images
+                # --min-age, пока транзакция с новой ссылкой не завершена.
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Файл успел удалить gc_recipe_images: записываем заново.
+                pass
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,154 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredients,
+                            Shopping_cart, ShoppingListIngredient, Tag)
+
+User = get_user_model()
+
+
+class ShoppingListAggregateTest(TestCase):
+    """Список покупок совпадает с суммой по корзине после любых правок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+        cls.tag = Tag.objects.create(
+            name='Обед', slug='lunch', color='#49B64E')
+        cls.flour, cls.milk, cls.eggs = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Молоко', 'Яйца')
+        )
+        cls.pancakes = cls.create_recipe(
+            'Блины', {cls.flour: 200, cls.milk: 500, cls.eggs: 2})
+        cls.bread = cls.create_recipe('Хлеб', {cls.flour: 500})
+
+    @classmethod
+    def create_recipe(cls, name, amounts):
+        recipe = Recipe.objects.create(
+            name=name, text='Текст', cooking_time=10, author=cls.author)
+        recipe.tags.set([cls.tag])
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe, ingredient=ingredient,
+                              amount=amount)
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def assert_shopping_lists(self):
+        stored = {
+            (row.user_id, row.ingredient_id): row.amount
+            for row in ShoppingListIngredient.objects.all()
+        }
+        expected = {
+            (row['recipe__in_shopping_cart__user'], row['ingredient']):
+                row['total']
+            for row in RecipeIngredients.objects.filter(
+                recipe__in_shopping_cart__isnull=False
+            ).order_by().values(
+                'recipe__in_shopping_cart__user', 'ingredient'
+            ).annotate(total=Sum('amount'))
+        }
+        self.assertEqual(stored, expected)
+        return stored
+
+    def test_add_and_remove_through_api(self):
+        for recipe in (self.pancakes, self.bread):
+            response = self.client.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+        stored = self.assert_shopping_lists()
+        self.assertEqual(stored[(self.buyer.pk, self.flour.pk)], 700)
+
+        response = self.client.delete(
+            f'/api/recipes/{self.pancakes.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.assert_shopping_lists(),
+                         {(self.buyer.pk, self.flour.pk): 500})
+
+    def test_batch_add_and_remove(self):
+        recipe_ids = [self.pancakes.pk, self.bread.pk]
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'recipes': recipe_ids}, format='json')
+        self.assert_shopping_lists()
+        self.client.delete('/api/recipes/shopping_cart/',
+                           {'recipes': recipe_ids}, format='json')
+        self.assertEqual(self.assert_shopping_lists(), {})
+
+    def test_orm_create_and_delete(self):
+        cart = Shopping_cart.objects.create(
+            user=self.buyer, recipe=self.pancakes)
+        self.assert_shopping_lists()
+        cart.delete()
+        self.assertEqual(self.assert_shopping_lists(), {})
+
+    def test_recipe_update_through_api(self):
+        for user in (self.buyer, self.author):
+            Shopping_cart.objects.add(user.pk, self.pancakes.pk)
+        Shopping_cart.objects.add(self.buyer.pk, self.bread.pk)
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{self.pancakes.pk}/',
+            {'tags': [self.tag.pk],
+             'ingredients': [{'id': self.flour.pk, 'amount': 250},
+                             {'id': self.eggs.pk, 'amount': 3}]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        stored = self.assert_shopping_lists()
+        self.assertEqual(stored[(self.buyer.pk, self.flour.pk)], 750)
+        self.assertNotIn((self.author.pk, self.milk.pk), stored)
+
+    def test_recipe_delete(self):
+        Shopping_cart.objects.add(self.buyer.pk, self.pancakes.pk)
+        Shopping_cart.objects.add(self.buyer.pk, self.bread.pk)
+        self.pancakes.delete()
+        self.assertEqual(self.assert_shopping_lists(),
+                         {(self.buyer.pk, self.flour.pk): 500})
+
+    def test_admin_inline_change(self):
+        Shopping_cart.objects.add(self.buyer.pk, self.pancakes.pk)
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        rows = list(RecipeIngredients.objects.filter(
+            recipe=self.pancakes).order_by('pk'))
+        prefix = 'recipeingredients_set'
+        data = {
+            'name': self.pancakes.name,
+            'text': self.pancakes.text,
+            'cooking_time': self.pancakes.cooking_time,
+            'author': self.author.pk,
+            'tags': [self.tag.pk],
+            f'{prefix}-TOTAL_FORMS': len(rows) + 1,
+            f'{prefix}-INITIAL_FORMS': len(rows),
+            f'{prefix}-MIN_NUM_FORMS': 0,
+            f'{prefix}-MAX_NUM_FORMS': 1000,
+        }
+        changes = {self.flour.pk: 300, self.milk.pk: None, self.eggs.pk: 2}
+        for index, row in enumerate(rows):
+            data.update({
+                f'{prefix}-{index}-id': row.pk,
+                f'{prefix}-{index}-recipe': self.pancakes.pk,
+                f'{prefix}-{index}-ingredient': row.ingredient_id,
+                f'{prefix}-{index}-amount': (
+                    changes[row.ingredient_id] or row.amount),
+            })
+            if changes[row.ingredient_id] is None:
+                data[f'{prefix}-{index}-DELETE'] = 'on'
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.pancakes.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.assert_shopping_lists(), {
+            (self.buyer.pk, self.flour.pk): 300,
+            (self.buyer.pk, self.eggs.pk): 2,
+        })
@@ -1,9 +1,15 @@
 from django.contrib import admin
 
-from .models import Subscription
+from .models import Subscription, UserStats
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
     search_fields = ('user', 'author')
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipes_count')
+    search_fields = ('user__username',)
@@ -1,3 +1,4 @@
+from django.apps import apps
 from django.contrib.auth import get_user_model
 from django.db import models
 
@@ -25,3 +26,35 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'Подписка {self.user} на {self.author}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество рецептов',
+    )
+
+    class Meta:
+        verbose_name = 'статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return f'У {self.user} {self.recipes_count} рецептов'
+
+    @classmethod
+    def recount(cls, *user_ids):
+        """Пересчитывает recipes_count авторов по их рецептам."""
+        for user_id in set(user_ids) - {None}:
+            cls.objects.update_or_create(
+                user_id=user_id,
+                defaults={'recipes_count': apps.get_model(
+                    'recipes', 'Recipe').objects.filter(
+                    author_id=user_id).count()},
+            )
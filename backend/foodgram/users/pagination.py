@@ -1,7 +1,57 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 20
+
+
+class CustomCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 20
+
+
+class RecipeCursorPagination(CustomCursorPagination):
+    ordering = ('-pub_date', 'id')
+
+
+class UserCursorPagination(CustomCursorPagination):
+    ordering = ('id',)
+
+
+class CursorOrPageNumberPagination(CustomPageNumberPagination):
+    """Постраничная пагинация с опциональным режимом курсора.
+
+    Если в запросе есть параметр cursor (для первой страницы — пустой,
+    ?cursor=), используется keyset-пагинация без COUNT(*) и OFFSET.
+    Иначе ответ остаётся прежним: count/next/previous/results.
+    """
+    cursor_pagination_class = None
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_class = self.cursor_pagination_class
+        if (cursor_class is not None
+                and cursor_class.cursor_query_param in request.query_params):
+            self.cursor_paginator = cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(CursorOrPageNumberPagination):
+    cursor_pagination_class = RecipeCursorPagination
+
+
+class UserPagination(CursorOrPageNumberPagination):
+    cursor_pagination_class = UserCursorPagination
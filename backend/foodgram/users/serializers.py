@@ -3,6 +3,7 @@ from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
+from api.fields import ImageRenditionsField
 from recipes.models import Recipe
 from users.models import Subscription
 
@@ -15,12 +16,25 @@ class CustomUserSerializer(UserSerializer):
     )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request', None)
-        if user and user.user.is_authenticated:
-            return Subscription.objects.filter(
-                user=user.user, author=obj).exists()
+        request = self.context.get('request', None)
+        if request and request.user.is_authenticated:
+            return obj.id in self.get_subscribed_author_ids(request)
         return False
 
+    @staticmethod
+    def get_subscribed_author_ids(request):
+        """Id авторов, на которых подписан пользователь.
+
+        Загружаются одним запросом и кэшируются на объекте запроса, чтобы
+        все вложенные сериализаторы использовали одно и то же множество.
+        """
+        if not hasattr(request, '_subscribed_author_ids'):
+            request._subscribed_author_ids = set(
+                Subscription.objects.filter(
+                    user=request.user).values_list('author_id', flat=True)
+            )
+        return request._subscribed_author_ids
+
     class Meta:
         model = User
         fields = ('id', 'username', 'first_name', 'last_name', 'email',
@@ -52,10 +66,11 @@ class ChangePasswordSerializer(serializers.Serializer):
 
 
 class SubRecipesSerializer(serializers.ModelSerializer):
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', "image", "cooking_time")
+        fields = ('id', 'name', "image", 'images', "cooking_time")
 
 
 class SubscriptionSerializer(CustomUserSerializer):
@@ -64,19 +79,29 @@ class SubscriptionSerializer(CustomUserSerializer):
         method_name='get_recipes_count'
     )
 
-    def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj)
-
-        recipes_limit = self.context.get(
-            'request').query_params.get('recipes_limit')
+    @staticmethod
+    def get_recipes_limit(request):
+        recipes_limit = request.query_params.get('recipes_limit')
         if recipes_limit and recipes_limit.isdigit():
-            recipes_limit = int(recipes_limit)
-            recipes = recipes[:recipes_limit]
+            return int(recipes_limit)
+        return None
+
+    def get_recipes(self, obj):
+        request = self.context.get('request')
+        # Для страницы подписок рецепты всех авторов загружены заранее.
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            recipes = Recipe.objects.filter(author=obj)
+            recipes_limit = self.get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
 
         if recipes:
             serializer = SubRecipesSerializer(
                 recipes,
-                context={'request': self.context.get('request')},
+                context={'request': request},
                 many=True
             )
             return serializer.data
@@ -84,7 +109,8 @@ class SubscriptionSerializer(CustomUserSerializer):
         return []
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        stats = getattr(obj, 'stats', None)
+        return stats.recipes_count if stats else 0
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
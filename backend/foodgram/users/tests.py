@@ -0,0 +1,56 @@
+from base64 import b64encode
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+
+
+class SubscriptionsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        for number in range(3):
+            Recipe.objects.create(
+                name=f'Рецепт {number}', text='Текст', cooking_time=10,
+                author=cls.author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_no_subscriptions_with_recipes_limit(self):
+        response = self.client.get(SUBSCRIPTIONS_URL, {'recipes_limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_empty_cursor_page_with_recipes_limit(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        # Курсор за последним автором: страница пустая.
+        cursor = b64encode(f'p={self.author.pk}'.encode()).decode()
+        response = self.client.get(
+            SUBSCRIPTIONS_URL, {'cursor': cursor, 'recipes_limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_recipes_limit(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        response = self.client.get(SUBSCRIPTIONS_URL, {'recipes_limit': 2})
+        self.assertEqual(response.status_code, 200)
+        (author,) = response.data['results']
+        self.assertEqual(len(author['recipes']), 2)
+        self.assertEqual(author['recipes_count'], 3)
+
+    def test_first_per_author_without_authors(self):
+        recipes = Recipe.objects.filter(author__in=[]).first_per_author(2)
+        self.assertEqual(list(recipes), [])
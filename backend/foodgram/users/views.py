@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
@@ -8,8 +10,10 @@ from rest_framework.permissions import (SAFE_METHODS, BasePermission,
                                         IsAuthenticated)
 from rest_framework.response import Response
 
+from api.timing import SerializerTimingMixin, span
+from recipes.models import Recipe
 from users.models import Subscription
-from users.pagination import CustomPageNumberPagination
+from users.pagination import UserPagination
 from users.serializers import (ChangePasswordSerializer,
                                CustomUserCreateSerializer,
                                CustomUserSerializer,
@@ -29,10 +33,10 @@ class CreateOnlyPermission(BasePermission):
         return request.method == 'POST'
 
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     permission_classes = [CreateOnlyPermission]
     queryset = User.objects.all()
-    pagination_class = CustomPageNumberPagination
+    pagination_class = UserPagination
 
     def get_serializer_class(self):
         if self.request.method != 'GET':
@@ -44,7 +48,9 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     def me(self, request):
         user = request.user
         serializer = CustomUserSerializer(user, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        with span('serializer'):
+            data = serializer.data
+        return Response(data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=("post",))
     def set_password(self, request, pk=None):
@@ -89,15 +95,30 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request, pk=None):
         user = self.request.user
-        user_subscriptions = user.subscribes.all()
-        authors = [item.author.id for item in user_subscriptions]
-        queryset = User.objects.filter(id__in=authors)
+        queryset = User.objects.filter(
+            pk__in=Subscription.objects.filter(user=user).values('author')
+        ).select_related('stats').order_by('id')
         queryset = self.filter_queryset(queryset)
-        paginated_queryset = self.paginate_queryset(queryset)
-        serializer = SubscriptionSerializer(paginated_queryset,
-                                            many=True,
-                                            context={'request': request})
-        return self.get_paginated_response(serializer.data)
+        authors = self.paginate_queryset(queryset)
+
+        recipes_by_author = defaultdict(list)
+        if authors:
+            recipes = Recipe.objects.filter(author__in=authors)
+            recipes_limit = SubscriptionSerializer.get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes.first_per_author(recipes_limit)
+            for recipe in recipes:
+                recipes_by_author[recipe.author_id].append(recipe)
+
+        serializer = SubscriptionSerializer(
+            authors,
+            many=True,
+            context={'request': request,
+                     'recipes_by_author': recipes_by_author}
+        )
+        with span('serializer'):
+            data = serializer.data
+        return self.get_paginated_response(data)
 
 
 class CustomAuthToken(ObtainAuthToken):